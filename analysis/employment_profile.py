@@ -2,12 +2,16 @@
 CLASSES REPRESENTING STRUCTURE OF L---e--- PROFILES
 """
 
+import pandas as pd
+
 
 class EmploymentRole:
     """
     On L---e--- profile, an :EmploymentRole is the title of a job position including the time period/time frame,
     and location e.g. Software Architect July 2010 - April 2015, New York
     """
+    __slots__ = ('title', 'timeframe', 'location')
+
     def __init__(self, title, timeframe='', location=''):
         self.title = title
         self.timeframe = timeframe
@@ -23,6 +27,8 @@ class Employment:
     A person can take many roles while working for a company. On L---e--- profile, an :Employment is a subsection that
     includes all employment roles/job positions of a single company. Each :Employment contains at least one :EmploymentRole.
     """
+    __slots__ = ('company_name', 'company_url', 'duration', 'roles')
+
     def __init__(self, company_name='', company_url='', roles=None, duration=''):
         self.company_name = company_name
         self.company_url = company_url
@@ -39,6 +45,8 @@ class EmploymentProfile:
     On L---e--- profile, an :EmploymentProfile is a whole 'Experience' section of the profile page.
     Each :EmploymentProfile contains at least one :Employment.
     """
+    __slots__ = ('employee_name', 'l---e---', 'employments')
+
     def __init__(self, employee_name, l---e---='', employments=None):
         self.employee_name = employee_name
         self.l---e--- = l---e---
@@ -47,3 +55,51 @@ class EmploymentProfile:
     def __str__(self):
         employments_str = "\n" + "\n".join([f'{e}\n' for e in self.employments])
         return f'Name: {self.employee_name}\nL---e---: {self.l---e---}\nEmployments:{employments_str}'
+
+
+class EmploymentRoleColumns:
+    """
+    A table of employment roles built column by column, i.e. one list per column instead of one object or tuple per
+    role, e.g. one row per role of a profile and author ID of the profile. Values of the :interned columns, such as
+    company names, titles and timeframes, which repeat across many profiles, are stored once per distinct value. Values
+    of the other columns, such as the employee name and URL, are stored once per run of equal values in consecutive
+    rows, i.e. once per profile.
+    """
+    __slots__ = ('columns', 'values', '_interned', '_strings')
+
+    def __init__(self, columns, interned=()):
+        """
+        :param columns: names of the columns
+        :param interned: names of the columns whose values are interned
+        """
+        self.columns = list(columns)
+        self.values = [[] for _ in self.columns]
+        self._interned = [column in interned for column in self.columns]
+        self._strings = {}
+
+    def __len__(self):
+        return len(self.values[0]) if self.values else 0
+
+    def append(self, row):
+        """
+        :param row: tuple with a value per column
+        """
+        for column_values, is_interned, value in zip(self.values, self._interned, row):
+            if is_interned:
+                value = self._strings.setdefault(value, value)
+            elif column_values and column_values[-1] == value:
+                value = column_values[-1]
+            column_values.append(value)
+
+    def clear(self):
+        """
+        Removes all rows, keeping the interned values for the next rows
+        """
+        for column_values in self.values:
+            column_values.clear()
+
+    def to_frame(self):
+        """
+        :return: the rows as a pandas.DataFrame
+        """
+        return pd.DataFrame(dict(zip(self.columns, self.values)), columns=self.columns)
@@ -0,0 +1,116 @@
+"""
+CACHE THE ROWS EXTRACTED FROM EVERY PROFILE PAGE, SO THAT ONLY NEW OR CHANGED PAGES ARE EXTRACTED AGAIN, AND THE
+TRIMMED FRAGMENTS OF THE PAGES, SO THAT PAGES EXTRACTED AGAIN NEED NOT BE READ AND PARSED AS A WHOLE
+"""
+
+import json
+import sqlite3
+import zlib
+
+
+class ExtractionCache:
+    """
+    A persistent on-disk cache (SQLite) of the rows extracted from every profile page, or the cause why the page could
+    not be extracted. Each entry is keyed by the path of the page and carries its size, modification time and content
+    hash, so that a page re-scraped since it was extracted is told apart from an unchanged one.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                          'digest TEXT, cause TEXT, rows TEXT)')
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def get_stats(self):
+        """
+        :return: dict of path -> (size, mtime_ns, digest) of every cached page
+        """
+        return {path: (size, mtime_ns, digest)
+                for path, size, mtime_ns, digest in self.conn.execute('SELECT path, size, mtime_ns, digest FROM pages')}
+
+    def get(self, path):
+        """
+        :param path: path of the page to look up
+        :return: (rows, cause) of the page, where rows is a list of tuples or None for a page that could not be extracted,
+        or None if the page is not cached
+        """
+        entry = self.conn.execute('SELECT cause, rows FROM pages WHERE path = ?', (path,)).fetchone()
+        if entry is None:
+            return None
+        cause, rows = entry
+        return None if rows is None else [tuple(row) for row in json.loads(rows)], cause
+
+    def put(self, entries):
+        """
+        Adds or replaces cache entries
+        :param entries: iterable of (path, size, mtime_ns, digest, rows or None, cause or None)
+        """
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)',
+                                  ((path, size, mtime_ns, digest, cause, None if rows is None else json.dumps(rows))
+                                   for path, size, mtime_ns, digest, rows, cause in entries))
+
+    def touch(self, entries):
+        """
+        Updates size and modification time of cached pages whose content has not changed
+        :param entries: iterable of (path, size, mtime_ns)
+        """
+        with self.conn:
+            self.conn.executemany('UPDATE pages SET size = ?, mtime_ns = ? WHERE path = ?',
+                                  ((size, mtime_ns, path) for path, size, mtime_ns in entries))
+
+    def remove(self, paths):
+        with self.conn:
+            self.conn.executemany('DELETE FROM pages WHERE path = ?', ((path,) for path in paths))
+
+
+class FragmentStore:
+    """
+    A persistent on-disk store (SQLite) of the trimmed fragments of the profile pages by :get_profile_fragment, kept
+    zlib compressed. Each entry is keyed by the path of the page and carries its size, modification time and content
+    hash as well as the tree builder the fragment was made with, so that fragments of re-scraped pages are not used.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS fragments (path TEXT PRIMARY KEY, size INTEGER, '
+                          'mtime_ns INTEGER, digest TEXT, tree_builder TEXT, fragment BLOB)')
+
+    def close(self):
+        self.conn.close()
+
+    def get_stats(self):
+        """
+        :return: dict of path -> (size, mtime_ns, digest, tree_builder) of every stored fragment
+        """
+        return {path: (size, mtime_ns, digest, tree_builder) for path, size, mtime_ns, digest, tree_builder in
+                self.conn.execute('SELECT path, size, mtime_ns, digest, tree_builder FROM fragments')}
+
+    def get(self, path):
+        """
+        :param path: path of the page to look up
+        :return: the fragment of the page as HTML markup, or None if no fragment is stored
+        """
+        entry = self.conn.execute('SELECT fragment FROM fragments WHERE path = ?', (path,)).fetchone()
+        return None if entry is None else zlib.decompress(entry[0]).decode('UTF-8')
+
+    def put(self, entries):
+        """
+        Adds or replaces fragments
+        :param entries: iterable of (path, size, mtime_ns, digest, tree_builder, fragment as HTML markup)
+        """
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?, ?, ?)',
+                                  ((path, size, mtime_ns, digest, tree_builder, zlib.compress(fragment.encode('UTF-8')))
+                                   for path, size, mtime_ns, digest, tree_builder, fragment in entries))
+
+    def remove(self, paths):
+        with self.conn:
+            self.conn.executemany('DELETE FROM fragments WHERE path = ?', ((path,) for path in paths))
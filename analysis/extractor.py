@@ -2,18 +2,26 @@
 EXTRACT EMPLOYMENT INFORMATION FROM L---e--- HTML PAGES STORED LOCALLY
 """
 
+import argparse
+import hashlib
 import logging
-from os.path import join, basename
-from bs4 import BeautifulSoup
+import random
+import time
+from functools import partial
+from itertools import chain
+from os.path import basename, isfile, join, splitext
 
 from analysis.utils import *
 from analysis.employment_profile import EmploymentProfile, Employment, EmploymentRole
+from analysis.extraction_cache import ExtractionCache, FragmentStore
+from analysis.faulty_log import FaultyPageLog, import_faulty_csv
+from analysis.profile_writer import ExtractedProfileWriter, RelationalProfileWriter
+from analysis.page_parser import get_profile_fragment, get_tree_builder, parse_profile_page
+from scraping.profile_source import is_archive, list_archive_pages, map_chunks_in_order, read_pages
 from config import ANALYSIS_SUBDIRS as PATH
 from config import EXTRACTOR_PARAMS as PARAM
 
-col_faulty_pages = 'Faulty_Pages'
-
-table_URL_AID = get_URL_AID_mappings(PARAM.URLS_DIR)
+cols_profile_row = [col_employee_name, col_URL, col_company_name, col_company_url, col_role, col_timeframe, col_location]
 
 
 def _parse_employment_timeframe(tframe_str):
@@ -43,192 +51,492 @@ def _parse_web_text(text):
     return text.strip('\n').partition('\n')[2]
 
 
-def _save_faulty_page_paths(paths_faulty_html):
+def _open_faulty_log():
     """
-    Function to store paths to faulty html files to file_path
+    Open the log of faulty pages :PARAM.FAULTY_LOG_FILE, importing the faulty pages CSV file :PARAM.FAULTY_PROFILES_CSV
+    written by earlier versions of the extractor if the log does not exist yet
     ======================================================================================
-    :param paths_faulty_html: set of paths to faulty html pages
+    :return: the :FaultyPageLog
     """
-    rows = []
-    for ep, err_cause in paths_faulty_html.items():
-        url = f'https://www.l---e---.com/in/{get_file_name(ep)}'
-        author_ids = table_URL_AID[url]
-        for aid in author_ids:
-            rows.append(pd.Series({col_AID: aid, col_faulty_pages: ep, 'Cause': err_cause}))
-    df = pd.DataFrame().append(rows, ignore_index=True)
-    df.sort_values(col_AID, inplace=True)
-    df.to_csv(PARAM.FAULTY_PROFILES_CSV, index=False)
-    logging.info(f'FILE_SAVED: Faulty profile paths stored ({PARAM.FAULTY_PROFILES_CSV})')
+    is_new = not os.path.isfile(PARAM.FAULTY_LOG_FILE)
+    faulty_log = FaultyPageLog(PARAM.FAULTY_LOG_FILE)
+    if is_new and os.path.isfile(PARAM.FAULTY_PROFILES_CSV):
+        import_faulty_csv(faulty_log, PARAM.FAULTY_PROFILES_CSV)
+    return faulty_log
 
 
-def _mark_faulty_pages(paths_faulty_htmls):
+def _decode_markup(content):
     """
-    Bookmark paths to faulty html pages and store them in file_path csv file
+    Decode the content of a html page read in binary mode
     ======================================================================================
-    :param paths_faulty_htmls: set of paths to faulty html pages
+    :param content: bytes of the html page
+    :return: the markup with the same newline translation as reading the file in text mode
     """
-    if os.path.isfile(PARAM.FAULTY_PROFILES_CSV):
-        df_existent_faulty_pages = pd.read_csv(PARAM.FAULTY_PROFILES_CSV, delimiter=',', header=0, dtype={col_AID: int})
-        for i, row in df_existent_faulty_pages.iterrows():
-            paths_faulty_htmls[row[col_faulty_pages]] = paths_faulty_htmls.get(row[col_faulty_pages])
+    return content.decode('UTF-8').replace('\r\n', '\n').replace('\r', '\n')
+
 
-    _save_faulty_page_paths(paths_faulty_htmls)
+def _extract_profile(markup, file_name, tree_builder='html.parser', restricted=False):
+    """
+    Extract the employment profile from the content of a single html page
+    ======================================================================================
+    :param markup: content of the html page, or its fragment by :get_profile_fragment
+    :param file_name: name of the html file without extension, which is the profile name in the profile URL
+    :param tree_builder: name of the BeautifulSoup tree builder to parse the page with
+    :param restricted: If True, only build the subtrees of the page the profile is extracted from
+    :return: the :EmploymentProfile extracted
+    :raise AttributeError: if the page does not contain the expected elements
+    """
+    return _read_profile(*parse_profile_page(markup, tree_builder, restricted), file_name)
 
 
-def _unmark_faulty_pages(extracted):
+def _read_profile(main_section, exp_section, file_name):
     """
-    Remove faulty pages found in previous runs from the list of faulty pages if they have been re-scraped correctly in the current run
+    Read the employment profile from the parts of a parsed html page
     ======================================================================================
-    :param extracted: set of paths to html files done with the extraction
-    :param faulty_prev: set of paths to faulty html files from previous runs
+    :param main_section: main.core-rail found by :parse_profile_page, or None
+    :param exp_section: section#experience-section found by :parse_profile_page, or None
+    :param file_name: name of the html file without extension, which is the profile name in the profile URL
+    :return: the :EmploymentProfile read
+    :raise AttributeError: if the page does not contain the expected elements
     """
-    df = pd.read_csv(PARAM.FAULTY_PROFILES_CSV, delimiter=',', header=0, dtype={col_AID: int})
-    cur_faulty_htmls = {row[col_faulty_pages]: row['Cause'] for i, row in df.iterrows()}
+    employee_name = main_section.find('div', {
+        'class': 'display-flex'}).find_next_sibling().ul.li.getText(strip=True)
+    employment_profile = EmploymentProfile(employee_name=employee_name,
+                                           l---e---=f'https://www.l---e---.com/in/{file_name}')
+
+    if not exp_section:
+        raise AttributeError('No employment found')
+
+    for li in exp_section.ul.findChildren('li', recursive=False):  # each 'li' is an occupation
+        employment = Employment()
+        company_profile_link = li.find('a', {'data-control-name': 'background_details_company'})['href']
+        employment.company_url = f'https://www.l---e---.com{company_profile_link}' if '/company/' in company_profile_link else ''
+        company_summary_info = li.find('div', {'class': 'pv-entity__company-summary-info'})
+        if company_summary_info is None:
+            employment.company_name = li.a.find('p', {'class': 'visually-hidden'}).find_next_sibling(
+                'p').getText(strip=True).replace('Full-time', '')
+            title = li.a.h3.getText()
+            timeframe = ''
+            if li.a.h4:
+                timeframe = li.a.h4.span.find_next_sibling().getText().replace(special_hyphen, tframe_sep)
+
+            employment.roles.append(EmploymentRole(title=title, timeframe=timeframe))
+
+        else:
+            employment.company_name = _parse_web_text(li.a.h3.getText())
+            employment.duration = _parse_web_text(li.a.h4.getText())
+            for role_li in li.ul.findChildren('li', recursive=False):
+                title = _parse_web_text(role_li.h3.getText())
+                timeframe_div = role_li.h3.find_next_sibling()
+                for _ in range(3):
+                    if 'Dates Employed' in timeframe_div.getText():
+                        break
+                    timeframe_div = timeframe_div.find_next_sibling()
+
+                timeframe = timeframe_div.find('span', {'class': ''}).getText().replace(special_hyphen, tframe_sep)
 
-    for page in set(extracted):
-        if cur_faulty_htmls.get(page):
-            del cur_faulty_htmls[page]
+                location_h4 = timeframe_div.find_next_sibling('h4')
+                location = '' if location_h4 is None else _parse_web_text(location_h4.getText())
 
-    _save_faulty_page_paths(cur_faulty_htmls)
+                employment.roles.append(EmploymentRole(title=title, timeframe=timeframe, location=location))
+
+        employment_profile.employments.append(employment)
+
+    return employment_profile
+
+
+def _get_profile_rows(profile):
+    """
+    Flatten an employment profile into one row per employment role
+    ======================================================================================
+    :param profile: the :EmploymentProfile to flatten
+    :return: list of tuples with the values of the columns :cols_profile_row
+    """
+    return [(profile.employee_name, profile.l---e---, employment.company_name, employment.company_url, role.title,
+             role.timeframe, role.location)
+            for employment in profile.employments for role in employment.roles]
 
 
-def _persist_extracted_profile(rows, finished_profiles_df):
+def _extract_pages(pages, tree_builder, restricted, make_fragments=False):
     """
-    Stores the list of Pandas rows as df into folder save_dir
+    Extract the employment profiles from a chunk of html pages. Runs in a worker process when the extractor runs with
+    several jobs. A page whose content hash equals the one recorded in the extraction cache is not extracted again, and a
+    page given with its stored fragment is extracted from the fragment instead of the whole page
     ======================================================================================
-    :param rows: list of data frame (df) rows to store as Pandas df
-    :param finished_profiles_df: the df of profiles extracted from the most recent run. This will be merged and stored together with the profiles extracted in the current run
+    :param pages: list of (path to html file, content hash recorded in the extraction cache or None, content of a page
+    read from an archive or None to read the html file, (content hash, fragment) stored for the page or None)
+    :param tree_builder: name of the BeautifulSoup tree builder to parse the pages with
+    :param restricted: If True, only build the subtrees of the pages the profiles are extracted from
+    :param make_fragments: If True, return the fragment by :get_profile_fragment of every page parsed as a whole
+    :return: list of (path, content hash, rows of the profile by :_get_profile_rows or None, cause why the page is
+    faulty or None, new fragment of the page or None). Both rows and cause are None for pages matching their recorded
+    content hash
     """
-    df = pd.DataFrame().append(rows, ignore_index=True)
-    if len(finished_profiles_df.index) > 0:
-        df = df.append(finished_profiles_df, ignore_index=True)
+    extracted = []
+    for html, known_digest, content, fragment in pages:
+        if fragment is not None:
+            digest, markup = fragment
+        else:
+            if content is None:
+                with open(html, 'rb') as file:
+                    content = file.read()
+            digest, markup = hashlib.sha1(content).hexdigest(), None
+        if digest == known_digest:
+            extracted.append((html, digest, None, None, None))
+            continue
+
+        main_section, exp_section = parse_profile_page(_decode_markup(content) if markup is None else markup,
+                                                       tree_builder, restricted)
+        new_fragment = get_profile_fragment(main_section, exp_section) if make_fragments and markup is None else None
+        try:
+            extracted.append((html, digest, _get_profile_rows(_read_profile(main_section, exp_section,
+                                                                            get_file_name(html))), None, new_fragment))
+        except AttributeError as ae:
+            extracted.append((html, digest, None, str(ae), new_fragment))
+    return extracted
+
+
+def _extract_pages_in_chunks(pages, tree_builder, restricted, jobs=1, chunk_size=100, archive=None, fragments=None,
+                             fragment_digests=None):
+    """
+    Extract the employment profiles from html pages chunk by chunk, in a pool of :jobs worker processes if :jobs > 1.
+    Results are yielded in the order of :pages regardless of :jobs, or with the pages extracted from their fragments
+    first and the others in the order they are stored in :archive, and a progress line is logged after each chunk
+    ======================================================================================
+    :param pages: list of (path to html file, content hash recorded in the extraction cache or None)
+    :param tree_builder: name of the BeautifulSoup tree builder to parse the pages with
+    :param restricted: If True, only build the subtrees of the pages the profiles are extracted from
+    :param jobs: number of worker processes
+    :param chunk_size: number of pages dispatched to a worker at once
+    :param archive: path to the archive the pages are streamed from, or None to read the html files in the workers.
+    All :pages must be stored in the archive
+    :param fragments: the :FragmentStore to read the stored fragments from and to make new fragments for, or None
+    :param fragment_digests: dict of path -> content hash of the pages to be extracted from their stored fragments
+    :return: generator of (path, content hash, rows of the profile or None, cause why the page is faulty or None, new
+    fragment of the page or None)
+    """
+    fragment_digests = fragment_digests or {}
+
+    def with_fragment(html, known_digest, content=None):
+        if html not in fragment_digests:
+            return html, known_digest, content, None
+        return html, known_digest, None, (fragment_digests[html], fragments.get(html))
+
+    if archive is None:
+        contents = (with_fragment(html, known_digest) for html, known_digest in pages)
+    else:
+        known_digests = {html: known_digest for html, known_digest in pages if html not in fragment_digests}
+        contents = (with_fragment(html, known_digest) for html, known_digest in pages if html in fragment_digests)
+        if known_digests:  # otherwise every page is extracted from its fragment and the archive is not read at all
+            contents = chain(contents, ((html, known_digests[html], content, None) for html, content in
+                                        read_pages(known_digests, archive=archive, prefetch=PARAM.PREFETCH)))
+
+    extract_chunk = partial(_extract_pages, tree_builder=tree_builder, restricted=restricted,
+                            make_fragments=fragments is not None)
+    start, done = time.perf_counter(), 0
+    for extracted in map_chunks_in_order(extract_chunk, contents, jobs, chunk_size):
+        yield from extracted
+        done += len(extracted)
+        logging.info(f'PROGRESS: {done}/{len(pages)} pages extracted '
+                     f'({done / max(time.perf_counter() - start, 1e-6):.0f} pages/s)')
+
+
+def _extract_profile_pages(html_files, is_full_listing, archive_listing=None):
+    """
+    Extract the employment profiles from html pages. If :PARAM.USE_CACHE is set, pages whose size and modification time
+    or content hash are unchanged since they were last extracted are taken from the extraction cache instead, and the
+    cache is updated with the pages extracted. If :PARAM.USE_FRAGMENTS is set, pages to be extracted whose size and
+    modification time are unchanged since their fragment was stored are extracted from the fragment, and fragments are
+    stored for the other pages
+    ======================================================================================
+    :param html_files: list of paths to html files, sorted by :get_file_name
+    :param is_full_listing: If True, :html_files are all pages of :PARAM.PROFILE_DIR, so that pages that have been
+    removed are dropped from the cache
+    :param archive_listing: the pages stored in :PARAM.PROFILE_DIR by :list_archive_pages if it is an archive, or None
+    if it is a folder. Pages not stored in the archive are skipped
+    :return: generator of (path, rows of the profile or None, cause why the page is faulty or None), sorted by
+    :get_file_name
+    """
+    cache = ExtractionCache(PARAM.CACHE_FILE) if PARAM.USE_CACHE else None
+    fragments = FragmentStore(PARAM.FRAGMENT_FILE) if PARAM.USE_FRAGMENTS else None
+    tree_builder = get_tree_builder(PARAM.HTML_PARSER)
+    fresh, touched, new_fragments = [], [], []
+    try:
+        known = cache.get_stats() if cache is not None else {}
+        stats, to_extract = {}, []
+        if archive_listing is not None:
+            for html in set(html_files).difference(archive_listing):
+                logging.warning(f'NOT_FOUND: Page {html} is not stored in the archive')
+            html_files = [html for html in html_files if html in archive_listing]
+        for html in html_files:
+            known_page = known.get(html)
+            if archive_listing is not None:
+                stats[html] = archive_listing[html]
+            else:
+                try:
+                    stat = os.stat(html)
+                except FileNotFoundError:
+                    to_extract.append((html, None))
+                    continue
+                stats[html] = (stat.st_size, stat.st_mtime_ns)
+            if not known_page or tuple(known_page[:2]) != stats[html]:
+                to_extract.append((html, known_page[2] if known_page else None))
+
+        if known:
+            logging.info(f'REUSED: {len(html_files) - len(to_extract)} unchanged pages, {len(to_extract)} new or '
+                         f'modified pages to extract')
+
+        known_fragments = fragments.get_stats() if fragments is not None else {}
+        fragment_digests = {html: known_fragments[html][2] for html, _ in to_extract
+                            if html in known_fragments and html in stats
+                            and tuple(known_fragments[html][:2]) == stats[html]
+                            and known_fragments[html][3] == tree_builder}
+        if fragment_digests:
+            logging.info(f'REUSED: {len(fragment_digests)} pages to extract from their stored fragments')
+
+        archive = PARAM.PROFILE_DIR if archive_listing is not None else None
+        extracted = _extract_pages_in_chunks(to_extract, tree_builder, PARAM.RESTRICTED_PARSE, jobs=PARAM.JOBS,
+                                             chunk_size=PARAM.CHUNK_SIZE, archive=archive, fragments=fragments,
+                                             fragment_digests=fragment_digests)
+        to_extract = {html for html, _ in to_extract}
+        # pages streamed from an archive arrive in the order they are stored in it, so the ones ahead are held back
+        pending = {}
+        for html in html_files:
+            if html not in to_extract:
+                yield (html, *cache.get(html))
+                continue
 
-    df.sort_values(col_URL, inplace=True)
-    file_ = join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__extracted_profiles_{get_now()}.csv')
-    df.to_csv(file_, index=False)
-    logging.info(f'SUCCESS: Profile data extracted to {file_}')
+            while html not in pending:
+                extracted_html, *result = next(extracted)
+                pending[extracted_html] = result
+            digest, rows, cause, fragment = pending.pop(html)
+            if fragment is not None:
+                new_fragments.append((html, *stats[html], digest, tree_builder, fragment))
+                if len(new_fragments) >= PARAM.CHUNK_SIZE:
+                    fragments.put(new_fragments)
+                    new_fragments = []
+            if html in known and digest == known[html][2]:
+                touched.append((html, *stats[html]))
+                rows, cause = cache.get(html)
+            elif cache is not None:
+                fresh.append((html, *stats[html], digest, rows, cause))
+                if len(fresh) >= PARAM.CHUNK_SIZE:
+                    cache.put(fresh)
+                    fresh = []
+            yield html, rows, cause
+
+        if is_full_listing and cache is not None:
+            cache.remove(set(known) - set(html_files))
+        if is_full_listing and fragments is not None:
+            fragments.remove(set(known_fragments) - set(html_files))
+    finally:
+        if cache is not None:
+            cache.put(fresh)
+            cache.touch(touched)
+            cache.close()
+        if fragments is not None:
+            fragments.put(new_fragments)
+            fragments.close()
 
 
-def extract():
+def compare_html_parsers(html_files, tree_builder, sample_size=None, seed=0, archive=None):
     """
-    Main function that run the extraction of profiles from html pages to usable data in csv format
-    Faulty profile pages will be bookmarked in a CSV file
+    Validate the profiles extracted with :tree_builder and the current :PARAM.RESTRICTED_PARSE against the ones
+    extracted from the whole page tree built by 'html.parser' on a (random sample of a) corpus of profile pages
+    ======================================================================================
+    :param html_files: list of paths to html files
+    :param tree_builder: name of the BeautifulSoup tree builder to be validated
+    :param sample_size: number of files to sample, or None to compare on all :html_files
+    :param seed: seed for drawing the sample
+    :param archive: path to the archive the pages are stored in, or None for loose html files
+    :return: dict of path of each file the extractions disagree on -> (rows by :tree_builder, rows by 'html.parser'),
+    where the rows of a faulty page are None
+    """
+    if sample_size is not None and sample_size < len(html_files):
+        html_files = random.Random(seed).sample(html_files, sample_size)
+
+    mismatches = {}
+    for html, content in read_pages(html_files, archive=archive):
+        markup = _decode_markup(content)
+        extractions = []
+        for builder, restricted in ((tree_builder, PARAM.RESTRICTED_PARSE), ('html.parser', False)):
+            try:
+                extractions.append(_get_profile_rows(_extract_profile(markup, get_file_name(html), builder, restricted)))
+            except AttributeError:
+                extractions.append(None)
+        if extractions[0] != extractions[1]:
+            mismatches[html] = tuple(extractions)
+    return mismatches
+
+
+def _list_profile_archive():
+    """
+    :return: the pages stored in :PARAM.PROFILE_DIR by :list_archive_pages if it is an archive, or None if it is a folder
+    """
+    return list_archive_pages(PARAM.PROFILE_DIR) if is_archive(PARAM.PROFILE_DIR) else None
+
+
+def verify_html_parser(sample_size, archive_listing=None):
+    """
+    Check on a random sample of the profile pages in :PARAM.PROFILE_DIR that the configured :PARAM.HTML_PARSER extracts
+    the same profiles as the whole page tree built by 'html.parser'. Every disagreement is logged
+    ======================================================================================
+    :param sample_size: number of profile pages to compare on
+    :param archive_listing: the pages stored in :PARAM.PROFILE_DIR by :list_archive_pages if it is an archive and has
+    been listed already, or None
+    :return: True if both extract the same profiles from all sampled pages
     """
+    archive_listing = archive_listing if archive_listing is not None else _list_profile_archive()
+    if archive_listing is not None:
+        archive, html_files = PARAM.PROFILE_DIR, sorted(archive_listing)
+    else:
+        archive, html_files = None, sorted(glob.glob(join(PARAM.PROFILE_DIR, '*.html')))
+    mismatches = compare_html_parsers(html_files, get_tree_builder(PARAM.HTML_PARSER), sample_size=sample_size,
+                                      archive=archive)
+    for html, (rows, reference_rows) in mismatches.items():
+        logging.warning(f'PARSER_MISMATCH: {html} {PARAM.HTML_PARSER}={rows}, html.parser={reference_rows}')
+    logging.info(f'PARSER_VERIFIED: {min(sample_size, len(html_files)) - len(mismatches)} of '
+                 f'{min(sample_size, len(html_files))} sampled pages extracted equally')
+    return not mismatches
+
+
+def _get_profile_url(html):
+    return f'https://www.l---e---.com/in/{get_file_name(html)}'
+
+
+def _resolve_target_pages(urls, author_ids, faulty_log, url_mappings, archive_listing=None):
+    """
+    Resolve the profiles to be extracted again to their html pages in :PARAM.PROFILE_DIR
+    ======================================================================================
+    :param urls: iterable of profile URLs
+    :param author_ids: iterable of author IDs, resolved to the profile URLs listed with them in :PARAM.URLS_DIR
+    :param faulty_log: the :FaultyPageLog to add the pages currently faulty from, or None
+    :param url_mappings: the :URLAuthorMappings of :PARAM.URLS_DIR
+    :param archive_listing: the pages stored in :PARAM.PROFILE_DIR by :list_archive_pages if it is an archive, or None
+    if it is a folder
+    :return: list of paths to the html files found, sorted by :get_file_name
+    """
+    urls = set(urls)
+    for aid in author_ids:
+        aid_urls = url_mappings.get_urls(aid)
+        if not aid_urls:
+            logging.warning(f'NOT_FOUND: author_id {aid} is not listed in {PARAM.URLS_DIR}')
+        urls.update(aid_urls)
+
+    names = {url.rstrip('/').partition('/in/')[2].partition('?')[0]: url for url in urls}
+    if archive_listing is not None:
+        pages = {get_file_name(page): page for page in archive_listing}
+    else:
+        pages = {name: join(PARAM.PROFILE_DIR, f'{name}.html') for name in names
+                 if isfile(join(PARAM.PROFILE_DIR, f'{name}.html'))}
+    target_htmls = set()
+    for name, url in names.items():
+        if name in pages:
+            target_htmls.add(pages[name])
+        else:
+            logging.warning(f'NOT_FOUND: No page of {url} in {PARAM.PROFILE_DIR}')
 
-    finished_profile_urls = set()
-    finished_profiles_df = pd.DataFrame()
-    if PARAM.CONTINUE_LAST_RUN:
-        profile_info_files = glob.glob(join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__extracted_profiles_*.csv'))
-        last_extraction_file = '' if len(profile_info_files) == 0 else profile_info_files[-1]
-        if os.path.isfile(last_extraction_file):
-            finished_profiles_df = pd.read_csv(last_extraction_file, delimiter=',', header=0, dtype={col_AID: int})
+    if faulty_log is not None:
+        stored = set(archive_listing) if archive_listing is not None else None
+        for html in faulty_log.get_faulty_pages():
+            if (html in stored) if stored is not None else isfile(html):
+                target_htmls.add(html)
+            else:
+                logging.warning(f'NOT_FOUND: Faulty page {html} does not exist anymore')
+    return sorted(target_htmls, key=get_file_name)
 
-        for i, row in finished_profiles_df.iterrows():
-            finished_profile_urls.add(row[col_URL])
 
-    profiles = []
-    extracted_htmls = set()
-    faulty_pages = {}
+def _find_extracted_profiles():
+    """
+    Find the newest extracted profiles to merge the profiles extracted again into
+    ======================================================================================
+    :return: (path of the output without extension, list of the formats it is stored in, its layout 'rows' or
+    'relational'), or (None, [], None) if there is none
+    """
+    file_ = find_latest_extracted_profiles(join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__extracted_profiles_*'))
+    if file_ is None:
+        return None, [], None
+    file_base = splitext(file_)[0]
+    if file_.endswith('.tables'):
+        return file_base, [fmt for fmt in ('parquet', 'csv') if os.path.exists(join(file_, f'profiles.{fmt}'))], 'relational'
+    return file_base, [fmt for fmt in ('parquet', 'csv') if os.path.exists(f'{file_base}.{fmt}')], 'rows'
+
+
+def extract(urls=(), author_ids=(), faulty=False, archive_listing=None):
+    """
+    Main function that run the extraction of profiles from html pages to usable data in csv format
+    Faulty profile pages will be marked in the log of faulty pages, and previously faulty pages extracted correctly
+    will be resolved. If profiles are targeted by :urls, :author_ids or :faulty, only their pages are extracted, and
+    their rows replace the ones in the newest extracted profiles instead of writing a new output. The output is written
+    by :ExtractedProfileWriter, or by :RelationalProfileWriter if :PARAM.OUTPUT_LAYOUT is 'relational'
+    ======================================================================================
+    :param urls: iterable of profile URLs to extract again
+    :param author_ids: iterable of author IDs whose profiles to extract again
+    :param faulty: If True, extract the pages currently faulty in the log of faulty pages again
+    :param archive_listing: the pages stored in :PARAM.PROFILE_DIR by :list_archive_pages if it is an archive and has
+    been listed already, or None
+    """
+    is_targeted = bool(urls or author_ids or faulty)
+    url_mappings = get_url_author_mappings(PARAM.URLS_DIR)
+    file_base, formats, layout = _find_extracted_profiles() if is_targeted else (None, [], None)
+    if is_targeted and file_base is None:
+        logging.warning('NOT_FOUND: No extracted profiles to merge the targeted profiles into, writing a new output')
+    file_base = file_base or join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__extracted_profiles_{get_now()}')
+    if (layout or PARAM.OUTPUT_LAYOUT) == 'relational':
+        writer = RelationalProfileWriter(file_base, cols_profile_row, formats=formats or PARAM.OUTPUT_FORMATS)
+    else:
+        writer = ExtractedProfileWriter(file_base, [col_AID] + cols_profile_row,
+                                        formats=formats or PARAM.OUTPUT_FORMATS)
+    faulty_log = _open_faulty_log()
+    faulty_pages, resolved_pages, extracted_urls = {}, [], set()
     try:
-        target_htmls = list()
-        if PARAM.RUN_PREV_FAULTY:
-            target_htmls = set(pd.read_csv()[col_faulty_pages])
+        archive_listing = archive_listing if archive_listing is not None else _list_profile_archive()
+        if is_targeted:
+            target_htmls = _resolve_target_pages(urls, author_ids, faulty_log if faulty else None, url_mappings,
+                                                 archive_listing=archive_listing)
+            logging.info(f'TARGETED: {len(target_htmls)} pages to extract again')
+        elif archive_listing is not None:
+            target_htmls = list(archive_listing)
         else:
             target_htmls = glob.glob(join(PARAM.PROFILE_DIR, '*.html'))
 
-        for i, html in enumerate(target_htmls):
-            # if i >= 40:
-            #     break
-            file_name = get_file_name(html)
-            if PARAM.CONTINUE_LAST_RUN and f'https://www.l---e---.com/in/{file_name}' in finished_profile_urls:
-                continue
-            try:
-                with open(html, encoding='UTF-8') as file:
-                    logging.info(f'EXTRACT:{i}.{join(basename(PARAM.PROFILE_DIR), file_name)}')
-                    bsoup = BeautifulSoup(file.read(), "html.parser")
-                    main_section = bsoup.find('main', {'class': 'core-rail'})
-                    employee_name = main_section.find('div', {
-                        'class': 'display-flex'}).find_next_sibling().ul.li.getText(strip=True)
-                    employment_profile = EmploymentProfile(employee_name=employee_name,
-                                                           l---e---=f'https://www.l---e---.com/in/{file_name}')
-
-                    exp_section = bsoup.find('section', {'id': 'experience-section'})
-                    if not exp_section:
-                        raise AttributeError('No employment found')
-
-                    for li in exp_section.ul.findChildren('li', recursive=False):  # each 'li' is an occupation
-                        employment = Employment()
-                        company_profile_link = li.find('a', {'data-control-name': 'background_details_company'})[
-                            'href']
-                        employment.company_url = f'https://www.l---e---.com{company_profile_link}' if '/company/' in company_profile_link else ''
-                        company_summary_info = li.find('div', {'class': 'pv-entity__company-summary-info'})
-                        if company_summary_info is None:
-                            employment.company_name = li.a.find('p', {'class': 'visually-hidden'}).find_next_sibling(
-                                'p').getText(strip=True).replace('Full-time', '')
-                            title = li.a.h3.getText()
-                            timeframe = ''
-                            if li.a.h4:
-                                timeframe = li.a.h4.span.find_next_sibling().getText().replace(special_hyphen,
-                                                                                               tframe_sep)
-
-                            employment.roles.append(EmploymentRole(title=title, timeframe=timeframe))
-
-                        else:
-                            employment.company_name = _parse_web_text(li.a.h3.getText())
-                            employment.duration = _parse_web_text(li.a.h4.getText())
-                            for role_li in li.ul.findChildren('li', recursive=False):
-                                title = _parse_web_text(role_li.h3.getText())
-                                timeframe_div = role_li.h3.find_next_sibling()
-                                for _ in range(3):
-                                    if 'Dates Employed' in timeframe_div.getText():
-                                        break
-                                    timeframe_div = timeframe_div.find_next_sibling()
-
-                                timeframe = timeframe_div.find('span', {'class': ''}).getText().replace(special_hyphen,
-                                                                                                        tframe_sep)
-
-                                location_h4 = timeframe_div.find_next_sibling('h4')
-                                location = '' if location_h4 is None else _parse_web_text(location_h4.getText())
-
-                                employment.roles.append(
-                                    EmploymentRole(title=title, timeframe=timeframe, location=location))
-
-                        employment_profile.employments.append(employment)
-
-                    profiles.append(employment_profile)
-                    if PARAM.RUN_PREV_FAULTY:
-                        extracted_htmls.add(html)
-
-            except AttributeError as ae:
-                logging.error(f'PROBLEM:Page {html} cannot be extracted - {ae}')
-                faulty_pages[html] = ae
+        # pages are extracted in the order of their profile URLs, so that the batches written are sorted by URL
+        target_htmls = sorted(target_htmls, key=get_file_name)
+        extracted = _extract_profile_pages(target_htmls, is_full_listing=not is_targeted,
+                                           archive_listing=archive_listing)
+        for i, (html, profile_rows, cause) in enumerate(extracted):
+            logging.info(f'EXTRACT:{i}.{join(basename(PARAM.PROFILE_DIR), get_file_name(html))}')
+            # the rows of a targeted profile are replaced even if its page turns out faulty now
+            url = _get_profile_url(html)
+            extracted_urls.add(url)
+            if cause is not None:
+                logging.error(f'PROBLEM:Page {html} cannot be extracted - {cause}')
+                faulty_pages[html] = cause
                 continue
+
+            writer.add(profile_rows, url_mappings.get_author_ids(url))
+            if faulty_log.is_faulty(html):
+                resolved_pages.append(html)
+
+            if not is_targeted and (i + 1) % PARAM.WRITE_BATCH_SIZE == 0:
+                writer.write()
     finally:
-        rows = []
-        for profile in profiles:
-            for employment in profile.employments:
-                for role in employment.roles:
-                    for aid in table_URL_AID[profile.l---e---]:
-                        row = {
-                            col_AID: aid,
-                            col_employee_name: profile.employee_name,
-                            col_URL: profile.l---e---,
-                            col_company_name: employment.company_name,
-                            col_company_url: employment.company_url,
-                            col_role: role.title,
-                            col_timeframe: role.timeframe,
-                            col_location: role.location
-                        }
-                        rows.append(pd.Series(row))
-        if rows:
-            _persist_extracted_profile(rows, finished_profiles_df)
-            if PARAM.RUN_PREV_FAULTY:
-                _unmark_faulty_pages(extracted_htmls)
+        if layout is not None:
+            writer.merge(extracted_urls)
+            logging.info(f'SUCCESS: {len(extracted_urls)} profiles merged into {", ".join(writer.get_outputs())}')
         else:
-            logging.info('EMPTY:No profiles extracted')
-
+            writer.write()
+            if writer.num_rows:
+                logging.info(f'SUCCESS: Profile data extracted to {", ".join(writer.get_outputs())}')
+            else:
+                logging.info('EMPTY:No profiles extracted')
+
+        faulty_log.resolve(resolved_pages)
+        if resolved_pages:
+            logging.info(f'RESOLVED: {len(resolved_pages)} previously faulty pages extracted')
         if faulty_pages:
-            _mark_faulty_pages(faulty_pages)
+            faulty_log.mark(faulty_pages)
+            logging.info(f'FILE_SAVED: {len(faulty_pages)} faulty pages logged ({PARAM.FAULTY_LOG_FILE})')
         else:
             logging.info('CLEAR:No faulty profiles found')
 
@@ -237,17 +545,40 @@ def run():
     """
         Main function executing the module
     """
+    parser = argparse.ArgumentParser(description='Extract the employment profiles from the profile pages',
+                                     fromfile_prefix_chars='@')
+    parser.add_argument('--urls', nargs='+', default=PARAM.TARGET_URLS, metavar='URL',
+                        help='only extract the profiles with these URLs again (@FILE reads one per line)')
+    parser.add_argument('--author-ids', nargs='+', type=int, default=PARAM.TARGET_AUTHOR_IDS, metavar='AID',
+                        help='only extract the profiles of these author IDs again (@FILE reads one per line)')
+    parser.add_argument('--faulty', action='store_true', default=PARAM.RUN_PREV_FAULTY,
+                        help='only extract the pages currently faulty in FAULTY_LOG_FILE again')
+    args = parser.parse_args()
+
     print("\n************************************** PARAMERTERS **************************************\n")
     print(f'TARGET_GROUP: {PARAM.TARGET_GROUP}\n')
     print(f'PROFILE_DIR: {PARAM.PROFILE_DIR}\n')
     print(f'URLS_DIR: {PARAM.URLS_DIR}\n')
-    print(f'FAULTY_PROFILES_CSV: {PARAM.FAULTY_PROFILES_CSV}\n')
-    print(f'CONTINUE_LAST_RUN: {PARAM.CONTINUE_LAST_RUN}\n')
+    print(f'FAULTY_LOG_FILE: {PARAM.FAULTY_LOG_FILE}\n')
+    print(f'USE_CACHE: {PARAM.USE_CACHE}\n')
+    print(f'USE_FRAGMENTS: {PARAM.USE_FRAGMENTS}\n')
     print(f'RUN_PREV_FAULTY: {PARAM.RUN_PREV_FAULTY}\n')
+    print(f'TARGET_URLS: {PARAM.TARGET_URLS}\n')
+    print(f'TARGET_AUTHOR_IDS: {PARAM.TARGET_AUTHOR_IDS}\n')
+    print(f'HTML_PARSER: {PARAM.HTML_PARSER}\n')
+    print(f'RESTRICTED_PARSE: {PARAM.RESTRICTED_PARSE}\n')
+    print(f'JOBS: {PARAM.JOBS}\n')
+    print(f'PREFETCH: {PARAM.PREFETCH}\n')
+    print(f'OUTPUT_FORMATS: {PARAM.OUTPUT_FORMATS}\n')
+    print(f'OUTPUT_LAYOUT: {PARAM.OUTPUT_LAYOUT}\n')
     print('*****************************************************************************************\n')
 
     logging.basicConfig(level=logging.INFO)
-    extract()
+    # an archive is listed once for both steps, since listing it means decompressing it
+    archive_listing = _list_profile_archive()
+    if PARAM.VERIFY_PARSER_SAMPLE_SIZE > 0:
+        verify_html_parser(PARAM.VERIFY_PARSER_SAMPLE_SIZE, archive_listing)
+    extract(urls=args.urls, author_ids=args.author_ids, faulty=args.faulty, archive_listing=archive_listing)
 
 
 if __name__ == '__main__':
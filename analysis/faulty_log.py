@@ -0,0 +1,190 @@
+"""
+KEEP TRACK OF THE PROFILE PAGES THAT CANNOT BE EXTRACTED IN AN APPEND-ONLY LOG
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from os.path import isfile
+
+from analysis.utils import *
+from config import EXTRACTOR_PARAMS as PARAM
+
+EVENT_FAULTY = 'faulty'
+EVENT_RESOLVED = 'resolved'
+# size of the events appended since the last snapshot of the state, from which on the snapshot is written again
+SNAPSHOT_AFTER_BYTES = 4 * 1024 ** 2
+
+
+class FaultyPageLog:
+    """
+    An append-only log (JSON Lines) of the events of profile pages found faulty or resolved by the extractor. Only
+    changes are logged, i.e. a page becoming faulty, its cause changing or the page being resolved, so that a run costs
+    as many events as pages changed. The log is the only source of the state. A snapshot of the state is saved to a
+    state file together with the size of the log it covers, so that only the events appended since are replayed when
+    the log is opened. The snapshot is only written when compacting or once SNAPSHOT_AFTER_BYTES of events have been
+    appended since the last one. :compact rewrites the log with the fewest events giving the same state.
+    """
+
+    def __init__(self, log_file):
+        """
+        :param log_file: path to the log file, which is created with the first event. The state is saved next to it in
+        {log_file}.state
+        """
+        self.log_file = log_file
+        self.state_file = f'{log_file}.state'
+        # page -> (cause, time marked faulty, time resolved or None)
+        self.state = {}
+        self._snapshot_size = self._load_state()
+        if isfile(log_file):
+            with open(log_file, 'rb') as file:
+                file.seek(self._snapshot_size)
+                for line in file:
+                    if line.strip():
+                        self._apply(json.loads(line))
+        self._save_state_if_due()
+
+    def _load_state(self):
+        """
+        :return: size of the log covered by the saved state, i.e. where to continue replaying the log, or 0 if there is
+        no saved state of the log
+        """
+        if not isfile(self.state_file) or not isfile(self.log_file):
+            return 0
+        with open(self.state_file, encoding='UTF-8') as file:
+            saved = json.load(file)
+        if saved['log_size'] > os.path.getsize(self.log_file):  # the log has been replaced since
+            return 0
+        self.state = {page: tuple(state) for page, state in saved['pages'].items()}
+        return saved['log_size']
+
+    def _save_state(self):
+        log_size = os.path.getsize(self.log_file) if isfile(self.log_file) else 0
+        with open(f'{self.state_file}.tmp', 'w', encoding='UTF-8') as file:
+            json.dump({'log_size': log_size, 'pages': self.state}, file)
+        os.replace(f'{self.state_file}.tmp', self.state_file)
+        self._snapshot_size = log_size
+
+    def _save_state_if_due(self):
+        if isfile(self.log_file) and os.path.getsize(self.log_file) - self._snapshot_size >= SNAPSHOT_AFTER_BYTES:
+            self._save_state()
+
+    def __len__(self):
+        return len(self.state)
+
+    def _apply(self, event):
+        page = event['page']
+        if event['event'] == EVENT_FAULTY:
+            self.state[page] = (event['cause'], event['time'], None)
+        elif page in self.state:
+            cause, since, _ = self.state[page]
+            self.state[page] = (cause, since, event['time'])
+
+    def _append(self, events):
+        if not events:
+            return
+        with open(self.log_file, 'a', encoding='UTF-8') as file:
+            file.writelines(f'{json.dumps(event)}\n' for event in events)
+        for event in events:
+            self._apply(event)
+        self._save_state_if_due()
+
+    def is_faulty(self, page):
+        """
+        :param page: path to the html file
+        :return: True if the page has been marked faulty and not resolved since
+        """
+        return page in self.state and self.state[page][2] is None
+
+    def get_faulty_pages(self):
+        """
+        :return: dict of path of every page currently faulty -> cause
+        """
+        return {page: cause for page, (cause, _, resolved) in self.state.items() if resolved is None}
+
+    def mark(self, faulty_pages):
+        """
+        Log pages found faulty. Only pages not currently faulty or whose cause has changed get an event
+        :param faulty_pages: dict of path to html file -> cause why it cannot be extracted
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self._append([{'event': EVENT_FAULTY, 'page': page, 'cause': cause, 'time': now}
+                      for page, cause in faulty_pages.items()
+                      if not self.is_faulty(page) or self.state[page][0] != cause])
+
+    def resolve(self, pages):
+        """
+        Log pages extracted correctly. Only the pages currently faulty get an event
+        :param pages: iterable of paths to html files
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self._append([{'event': EVENT_RESOLVED, 'page': page, 'time': now} for page in pages if self.is_faulty(page)])
+
+    def compact(self, drop_resolved=False):
+        """
+        Rewrite the log with one event per faulty page and two per resolved page
+        :param drop_resolved: If True, forget the resolved pages
+        """
+        if drop_resolved:
+            self.state = {page: state for page, state in self.state.items() if state[2] is None}
+        with open(f'{self.log_file}.tmp', 'w', encoding='UTF-8') as file:
+            for page, (cause, since, resolved) in sorted(self.state.items()):
+                file.write(f'{json.dumps({"event": EVENT_FAULTY, "page": page, "cause": cause, "time": since})}\n')
+                if resolved is not None:
+                    file.write(f'{json.dumps({"event": EVENT_RESOLVED, "page": page, "time": resolved})}\n')
+        os.replace(f'{self.log_file}.tmp', self.log_file)
+        self._save_state()
+
+    def to_frame(self, url_mappings=None):
+        """
+        :param url_mappings: :URLAuthorMappings to add the author IDs of the pages with, or None
+        :return: pandas.DataFrame of the current state with one row per page, or per page and author ID
+        """
+        df = pd.DataFrame([(page, cause, since, resolved)
+                           for page, (cause, since, resolved) in sorted(self.state.items())],
+                          columns=['Page', 'Cause', 'Faulty_Since', 'Resolved'])
+        if url_mappings is not None:
+            urls = (f'https://www.l---e---.com/in/{get_file_name(page)}' for page in df['Page'])
+            df.insert(0, col_AID, [sorted(url_mappings.get_author_ids(url)) for url in urls])
+            df = df.explode(col_AID, ignore_index=True)
+        return df
+
+
+def import_faulty_csv(faulty_log, csv_file):
+    """
+    Mark the pages listed in the faulty profiles CSV file written by earlier versions of the extractor
+    ======================================================================================
+    :param faulty_log: the :FaultyPageLog to mark the pages in
+    :param csv_file: path to the CSV file with the columns 'Faulty_Pages' and 'Cause'
+    """
+    df = pd.read_csv(csv_file, delimiter=',', header=0, usecols=['Faulty_Pages', 'Cause'], keep_default_na=False)
+    faulty_log.mark(dict(zip(df['Faulty_Pages'], df['Cause'].where(df['Cause'] != '', None))))
+    logging.info(f'IMPORTED: {df["Faulty_Pages"].nunique()} faulty pages from {csv_file}')
+
+
+def run():
+    """
+        Main function executing the module
+    """
+    parser = argparse.ArgumentParser(description='Show, compact or export the log of faulty profile pages')
+    parser.add_argument('--compact', action='store_true', help='rewrite the log with one event per page')
+    parser.add_argument('--drop-resolved', action='store_true', help='forget resolved pages when compacting')
+    parser.add_argument('--export', metavar='CSV_FILE', help='export the current state with the author IDs of the pages')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    faulty_log = FaultyPageLog(PARAM.FAULTY_LOG_FILE)
+    logging.info(f'FAULTY_PAGES: {len(faulty_log.get_faulty_pages())} faulty, '
+                 f'{len(faulty_log) - len(faulty_log.get_faulty_pages())} resolved pages in {PARAM.FAULTY_LOG_FILE}')
+    if args.compact:
+        faulty_log.compact(drop_resolved=args.drop_resolved)
+        logging.info(f'COMPACTED: {PARAM.FAULTY_LOG_FILE}')
+    if args.export:
+        faulty_log.to_frame(get_url_author_mappings(PARAM.URLS_DIR)).to_csv(args.export, index=False)
+        logging.info(f'FILE_SAVED: {args.export}')
+
+
+if __name__ == '__main__':
+    run()
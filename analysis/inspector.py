@@ -3,6 +3,7 @@ import enum
 import logging
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
@@ -152,6 +153,72 @@ def get_date_string(date):
     return date.strftime("%m/%Y")
 
 
+def _read_relational_profiles(tables_dir, dtype):
+    """
+    Read the relational tables written by the extractor with OUTPUT_LAYOUT = 'relational' and join the roles with their
+    employments and profiles in memory. The rows are not repeated per author ID, which are mapped to rows instead
+    Args:
+        tables_dir (str): path to the .tables folder
+        dtype (dict): types of the columns of CSV files, as for pandas.read_csv
+
+    Returns:
+        (tuple(pandas.DataFrame, dict)): the roles with the columns of their employments and profiles in the order they
+        were extracted, and dict of author ID -> positions of the rows of its profiles
+    """
+    tables = {}
+    for name in ('profiles', 'employments', 'roles', 'url_author'):
+        file_ = find_table(join(tables_dir, name))
+        if file_ is None:
+            raise FileNotFoundError(f'Table {name} of the extracted profiles not found in {tables_dir}')
+        tables[name] = read_table(file_, dtype=dtype)
+
+    df = tables['roles'].merge(tables['employments'], on=col_employment_id, how='left', sort=False) \
+        .merge(tables['profiles'], on=col_profile_id, how='left', sort=False)
+    profile_rows = df.groupby(col_profile_id, sort=False).indices
+    aid_rows = {}
+    for aid, profile_ids in tables['url_author'].groupby(col_AID, sort=False)[col_profile_id]:
+        rows = [profile_rows[profile_id] for profile_id in sorted(profile_ids) if profile_id in profile_rows]
+        if rows:
+            aid_rows[aid] = np.concatenate(rows)
+    return df, aid_rows
+
+
+def read_extracted_profiles():
+    """
+    Read the newest extracted profiles of the target group, preferring Parquet over CSV
+    Returns:
+        (tuple(pandas.DataFrame, dict)): the extracted profiles with parsed timeframes (see :parse_timeframes), and
+        dict of author ID -> positions of the rows of its profiles. Company names are categorical for Parquet files,
+        with categories sorted so that sorting by company name gives the same order as for strings. Relational tables
+        are joined into one row per role, without the author IDs
+    """
+    file_ = find_latest_extracted_profiles(join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__extracted_profiles_*'))
+    if file_ is None:
+        raise FileNotFoundError(f'No extracted profiles of {PARAM.TARGET_GROUP} found in {PATH.EXTRACTED_DATA}')
+    logging.info(f'READING: {file_}')
+
+    data_type = {col_AID: int, col_profile_id: int, col_employment_id: int, col_company_name: str,
+                 col_company_url: str, col_location: str}
+    if file_.endswith('.tables'):
+        df, aid_rows = _read_relational_profiles(file_, data_type)
+    else:
+        df = read_table(file_, dtype=data_type)
+        aid_rows = None
+    if df[col_company_name].dtype.name == 'category':
+        df[col_company_name] = df[col_company_name].cat.reorder_categories(
+            sorted(df[col_company_name].cat.categories))
+    if col_is_valid_timeframe in df.columns:
+        for column in (col_start_month, col_end_month):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int32')
+        for column in (col_is_present, col_is_valid_timeframe):
+            df[column] = df[column].astype(str).str.lower() == 'true'
+    else:  # extracted before the timeframes were parsed at extraction time
+        df = df.drop(columns=[col_start_month, col_end_month], errors='ignore').join(parse_timeframes(df[col_timeframe]))
+    if aid_rows is None:
+        aid_rows = df.groupby(col_AID, sort=False).indices
+    return df, aid_rows
+
+
 def mark_none_match(row, df_profile):
     """
     Save an acquisition data row that does not have acquiree and acquirer   into the global dict :NONE_MATCHED, which
@@ -223,11 +290,8 @@ class JobTransitionInspector:
 
     def __init__(self, csv_file):
         self.acquisitions = read_csv(csv_file)
-        data_type = {col_AID: int, col_company_name: str, col_company_url: str, col_location: str}
-        self.profiles_df = pd.read_csv(glob.glob(join(PATH.EXTRACTED_DATA, f'{PARAM.TARGET_GROUP}__*.csv'))[-1],
-                                       delimiter=',', header=0,
-                                       dtype=data_type,
-                                       keep_default_na=False)
+        # rows of the profiles of an author ID are looked up by their positions instead of filtering all rows
+        self.profiles_df, self.aid_rows = read_extracted_profiles()
         matcher.build_acquisition_company_ref_mappings(
             set(self.acquisitions[col_acquiree_name]).union(set(self.acquisitions[col_acquirer_name])))
 
@@ -244,13 +308,16 @@ class JobTransitionInspector:
             None. The :timeline list will get appended
         """
         # num_err_periods = 0
-        if df is not None:
-            for i, row in df.iterrows():
-                try:
-                    start, end = parse_employment_timeframe(row[col_timeframe])
-                    timeline.append(TimeFrame(category, row[col_company_name], start, end))
-                except InvalidTimeframeException as ipe:
-                    logging.warning(ipe)
+        if df is not None and len(df.index) > 0:
+            now = set_day_to_1(datetime.now())
+            for employer, timeframe, start, end, is_present, is_valid in zip(
+                    df[col_company_name], df[col_timeframe], df[col_start_month], df[col_end_month], df[col_is_present],
+                    df[col_is_valid_timeframe]):
+                if not is_valid:
+                    logging.warning(f'INVALID_TIMEFRAME: "{timeframe}" at {employer}')
+                    continue
+                timeline.append(TimeFrame(category, employer, from_month_ordinal(start),
+                                          now if is_present else from_month_ordinal(end)))
 
     @classmethod
     def _sort_timeframes(cls, e_df=None, r_df=None, o_df=None):
@@ -284,26 +351,21 @@ class JobTransitionInspector:
             tuple(pandas.Dataframe, pandas.Dataframe, pandas.Dataframe): df of employers matching acquiree, acquirer and not matching (others), respectively
         """
         profile_df.sort_values(by=col_company_name, ignore_index=True, inplace=True)
-        rows_matching_E = list()
-        rows_matching_R = list()
-        rows_others = list()
-
-        for j, profile_row in profile_df.iterrows():
-            employer = profile_row[col_company_name]
+        categories = []
+        for aid, url, employer in zip(profile_df[col_AID], profile_df[col_URL], profile_df[col_company_name]):
             if employer != '':
                 if matcher.match(employer=employer, other=acquiree):
-                    rows_matching_E.append(profile_row)
+                    categories.append('E')
                 elif matcher.match(employer=employer, other=acquirer):
-                    rows_matching_R.append(profile_row)
+                    categories.append('R')
                 else:
-                    rows_others.append(profile_row)
+                    categories.append('O')
             else:
-                FAULTIES[profile_row[col_AID]] = f'An empty employer found in profile {profile_row[col_URL]}'
+                categories.append('')
+                FAULTIES[aid] = f'An empty employer found in profile {url}'
 
-        df_E_matches = pd.DataFrame(rows_matching_E, columns=profile_df.columns)
-        df_R_matches = pd.DataFrame(rows_matching_R, columns=profile_df.columns)
-        df_others = pd.DataFrame(rows_others, columns=profile_df.columns)
-        return df_E_matches, df_R_matches, df_others
+        categories = pd.Series(categories, index=profile_df.index, dtype=object)
+        return profile_df[categories == 'E'], profile_df[categories == 'R'], profile_df[categories == 'O']
 
     @staticmethod
     def get_future_job_status(future_tframe, acq_date):
@@ -426,7 +488,10 @@ class JobTransitionInspector:
             logging.info(f'MATCHING:{i}.ACQUIREE={acquiree}, ACQUIRER={acquirer}')
             E_df, R_df, others_df = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-            profile_df = self.profiles_df[self.profiles_df[col_AID] == aid]
+            rows = self.aid_rows.get(aid)
+            profile_df = self.profiles_df.iloc[rows] if rows is not None else pd.DataFrame()
+            if rows is not None and col_AID not in profile_df.columns:
+                profile_df = profile_df.assign(**{col_AID: aid})
             if len(profile_df.index) > 0:
                 l---e---_id = profile_df.iloc[0][col_URL].partition("/in/")[2]
                 E_df, R_df, others_df = self._match_profile_with_E_R(profile_df, acquiree, acquirer)
@@ -539,9 +604,13 @@ class JobTransitionInspector:
                                         R_tframe_prior_acq=R_tframes_prior_acq_str)
             rrb.append()
 
-        pd.DataFrame.from_dict(RESULTS).to_csv(
-            join(PARAM.FINAL_DATA_DIR, f'{PARAM.TARGET_GROUP}__employment_continuity_by_acquisition_{get_now()}.csv'),
-            index=False)
+        results_file_base = join(PARAM.FINAL_DATA_DIR,
+                                 f'{PARAM.TARGET_GROUP}__employment_continuity_by_acquisition_{get_now()}')
+        results_types = {} if pa is None else {
+            col_AID: pa.int64(), col_days_to_next_job: pa.int64(), col_months_to_next_job: pa.int64(),
+            col_days_to_second_next_job: pa.int64(), col_months_to_second_next_job: pa.int64()}
+        save_table(pd.DataFrame.from_dict(RESULTS), results_file_base, formats=PARAM.OUTPUT_FORMATS,
+                   types=results_types)
         pd.DataFrame.from_dict(NONE_MATCHED).to_csv(
             join(PARAM.NONE_MATCHED_DIR, f'{PARAM.TARGET_GROUP}__none_matched_{get_now()}.csv'), index=False)
         pd.DataFrame([{
@@ -581,6 +650,7 @@ def run():
     print(f'FINAL_DATA_DIR: {PARAM.FINAL_DATA_DIR}\n')
     print(f'FAULTY_EMPLOYEES_DIR: {PARAM.FAULTY_EMPLOYEES_DIR}\n')
     print(f'NONE_MATCHED_DIR: {PARAM.NONE_MATCHED_DIR}\n')
+    print(f'OUTPUT_FORMATS: {PARAM.OUTPUT_FORMATS}\n')
     print('*****************************************************************************************\n')
 
     jti = JobTransitionInspector(PARAM.ACQ_FILE)
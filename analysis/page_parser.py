@@ -0,0 +1,64 @@
+"""
+PARSE SAVED L---e--- PROFILE PAGES INTO THE PARTS READ BY THE EXTRACTOR
+"""
+
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Only the top-level <main> and <section> elements and their subtrees are built in a restricted parse. Both the
+# main.core-rail and the section#experience-section are among them, while headers, navigation bars, footers and scripts
+# around them are skipped
+_PROFILE_PARTS = SoupStrainer(['main', 'section'])
+
+
+def get_tree_builder(name):
+    """
+    Resolves the name of a BeautifulSoup tree builder, falling back to the built-in 'html.parser' if the requested one
+    is not installed
+    ======================================================================================
+    :param name: 'lxml', 'html5lib' or 'html.parser'
+    :return: the name of the tree builder to be passed to BeautifulSoup
+    """
+    if name != 'html.parser':
+        try:
+            __import__(name)
+        except ImportError:
+            logging.warning(f'MISSING_PARSER: {name} is not installed, falling back to html.parser')
+            return 'html.parser'
+    return name
+
+
+def parse_profile_page(markup, tree_builder='html.parser', restricted=False):
+    """
+    Parses a saved profile page and looks up the parts the extraction logic reads from
+    ======================================================================================
+    :param markup: content of the HTML file
+    :param tree_builder: name of the BeautifulSoup tree builder resolved by :get_tree_builder
+    :param restricted: If True, only build the subtrees of the <main> and <section> elements instead of the whole page.
+    Not supported by 'html5lib', which always builds the whole page
+    :return: (main.core-rail, section#experience-section) as BeautifulSoup tags, each None if not found
+    """
+    parse_only = _PROFILE_PARTS if restricted and tree_builder != 'html5lib' else None
+    bsoup = BeautifulSoup(markup, tree_builder, parse_only=parse_only)
+    return bsoup.find('main', {'class': 'core-rail'}), bsoup.find('section', {'id': 'experience-section'})
+
+
+def get_profile_fragment(main_section, exp_section):
+    """
+    Trims a parsed profile page down to the elements the extractor reads: the div.display-flex heading the
+    main.core-rail and the element following it, which holds the employee name, and the section#experience-section.
+    Parsing the fragment with :parse_profile_page finds the same parts as parsing the whole page, including the ones
+    missing in a faulty page
+    ======================================================================================
+    :param main_section: main.core-rail found by :parse_profile_page, or None
+    :param exp_section: section#experience-section found by :parse_profile_page, or None
+    :return: the fragment as HTML markup, usually a few kilobytes
+    """
+    parts = []
+    if main_section is not None:
+        name_div = main_section.find('div', {'class': 'display-flex'})
+        header = [] if name_div is None else [name_div, name_div.find_next_sibling()]
+        parts.append(f'<main class="core-rail">{"".join(str(tag) for tag in header if tag is not None)}</main>')
+    if exp_section is not None:
+        parts.append(str(exp_section))
+    return ''.join(parts)
@@ -0,0 +1,390 @@
+"""
+WRITE EXTRACTED EMPLOYMENT ROWS IN BATCHES, SO THAT THE OUTPUT GROWS WHILE THE EXTRACTION IS RUNNING
+"""
+
+import io
+import logging
+from bisect import bisect_left, bisect_right
+from os.path import isdir, isfile, join
+
+from analysis.utils import *
+from analysis.employment_profile import EmploymentRoleColumns
+
+interned_columns = (col_company_name, col_company_url, col_role, col_timeframe, col_location)
+# consecutive IDs, which take almost no space with the delta encoding but a full integer each with dictionary encoding
+delta_encoded_columns = (col_profile_id, col_employment_id)
+
+
+class ExtractedProfileWriter:
+    """
+    Appends batches of extracted rows to a CSV file and/or to a Parquet dataset, i.e. a folder with one Parquet file per
+    batch. Every batch is complete on disk once :write returns, so a run that crashes leaves a valid partial result.
+    Files are only created with the first non-empty batch.
+
+    The timeframes are parsed by :parse_timeframes into the columns :col_start_month, :col_end_month, :col_is_present
+    and :col_is_valid_timeframe. In Parquet, author_id is an int64, company names are dictionary encoded and the month
+    ordinals are int32.
+    """
+
+    def __init__(self, file_base, columns, formats=('csv',)):
+        """
+        :param file_base: path of the output without extension, e.g. .../{group}__extracted_profiles_{now}
+        :param columns: names of the columns of the rows, author_id followed by the columns of the profile rows
+        :param formats: 'csv' and/or 'parquet'
+        """
+        self.file_base = file_base
+        self.columns = list(columns)
+        self.formats = _get_formats(formats)
+        self.schema = _get_schema(self.columns + [col_start_month, col_end_month, col_is_present,
+                                                  col_is_valid_timeframe])
+        self.rows = EmploymentRoleColumns(self.columns, interned=interned_columns)
+        self.num_rows = 0
+        self.num_batches = 0
+
+    @property
+    def csv_file(self):
+        return f'{self.file_base}.csv'
+
+    @property
+    def parquet_dir(self):
+        return f'{self.file_base}.parquet'
+
+    def _to_frame(self):
+        df = self.rows.to_frame()
+        self.rows.clear()
+        return df.join(parse_timeframes(df[col_timeframe]))
+
+    def add(self, profile_rows, author_ids):
+        """
+        Add the rows of a profile to the next batch, once per author ID listed with the profile
+        :param profile_rows: list of tuples with the values of the columns following author_id
+        :param author_ids: iterable of the author IDs of the profile
+        """
+        for profile_row in profile_rows:
+            for aid in author_ids:
+                self.rows.append((aid, *profile_row))
+
+    def write(self):
+        """
+        Write the rows added since the last batch as a new batch
+        """
+        if not len(self.rows):
+            return
+        df = self._to_frame()
+        _write_batch(df, self.file_base, self.formats, self.schema, self.num_batches)
+        self.num_rows += len(df)
+        self.num_batches += 1
+
+    def merge(self, urls):
+        """
+        Replace the rows of the profiles :urls in the output written before, e.g. by an earlier run, with the rows added,
+        keeping the output sorted by URL. Of a Parquet dataset, only the files holding rows of :urls or whose URL range
+        the new rows fall into are rewritten. A CSV file is rewritten as a whole
+        :param urls: set of the URLs of the profiles extracted again, including the ones that yield no rows now. The
+        URLs of all rows added must be in :urls
+        """
+        df = self._to_frame().sort_values(col_URL, kind='stable')
+        if 'parquet' in self.formats:
+            self._merge_parquet(df, urls)
+        if 'csv' in self.formats:
+            _merge_csv(self.csv_file, df, col_URL, urls, sort=True)
+        self.num_rows += len(df)
+        self.num_batches += 1
+
+    def _merge_parquet(self, df, urls):
+        parts = _get_parts(self.parquet_dir)
+        if not parts:
+            os.makedirs(self.parquet_dir, exist_ok=True)
+            if len(df):
+                _write_parquet(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False),
+                               join(self.parquet_dir, 'part-00000.parquet'))
+            return
+
+        # the parts are sorted by URL, so that the URL range of each part tells which parts the URLs belong to
+        ranges = [_get_column_range(part, col_URL) for part in parts]
+        ranges = [(start or '', end or '') for start, end in ranges]
+        starts = [start for start, _ in ranges]
+        new_urls = df.groupby(col_URL, sort=False).indices
+        assigned = defaultdict(list)
+        for url, indices in new_urls.items():
+            assigned[max(bisect_right(starts, url) - 1, 0)].extend(indices)
+        affected = set(assigned).union(i for i, (start, end) in enumerate(ranges)
+                                       if any(start <= url <= end for url in urls))
+        url_set = pa.array(sorted(urls), type=pa.string())
+        for i in sorted(affected):
+            table = pq.read_table(parts[i])
+            table = table.filter(pc.invert(pc.is_in(table.column(col_URL), value_set=url_set)))
+            if assigned.get(i):
+                new_rows = df.iloc[sorted(assigned[i])][table.schema.names]
+                table = pa.concat_tables([table, pa.Table.from_pandas(new_rows, schema=table.schema,
+                                                                      preserve_index=False)])
+                table = table.take(pc.sort_indices(table, sort_keys=[(col_URL, 'ascending')]))
+            _write_parquet(table, f'{parts[i]}.tmp')
+            os.replace(f'{parts[i]}.tmp', parts[i])
+        logging.info(f'MERGED: {len(affected)} of {len(parts)} files of {self.parquet_dir} rewritten')
+
+    def get_outputs(self):
+        """
+        :return: list of paths to the files or folders written
+        """
+        if not self.num_batches:
+            return []
+        return [self.csv_file if fmt == 'csv' else self.parquet_dir for fmt in self.formats]
+
+
+class RelationalProfileWriter:
+    """
+    Appends batches of extracted profiles to four tables in the folder {file_base}.tables, each stored like the output
+    of :ExtractedProfileWriter:
+        - profiles: Profile_ID, employee name and URL per profile
+        - employments: Employment_ID, Profile_ID, company name and company URL per employment, i.e. per run of roles at
+          the same company
+        - roles: Employment_ID, title, timeframe (also parsed by :parse_timeframes) and location per role
+        - url_author: author_id and Profile_ID per author ID listed with a profile
+    Unlike the rows of :ExtractedProfileWriter, a profile is stored once however many author IDs it is listed with.
+    IDs are consecutive in the order the profiles are added, so every table is sorted by the ID it refers to.
+    """
+
+    tables = {
+        'profiles': [col_profile_id, col_employee_name, col_URL],
+        'employments': [col_employment_id, col_profile_id, col_company_name, col_company_url],
+        'roles': [col_employment_id, col_role, col_timeframe, col_location],
+        'url_author': [col_AID, col_profile_id],
+    }
+
+    def __init__(self, file_base, columns, formats=('csv',)):
+        """
+        :param file_base: path of the output without extension, e.g. .../{group}__extracted_profiles_{now}
+        :param columns: names of the columns of the profile rows, incl. the employee name, URL, company name and URL,
+        title, timeframe and location
+        :param formats: 'csv' and/or 'parquet'
+        """
+        self.file_base = file_base
+        self.columns = list(columns)
+        # positions of the values of every table in the profile rows
+        self._positions = [self.columns.index(column) for column in (
+            col_employee_name, col_URL, col_company_name, col_company_url, col_role, col_timeframe, col_location)]
+        self.formats = _get_formats(formats)
+        self.schemas = {name: _get_schema(table_columns + ([col_start_month, col_end_month, col_is_present,
+                                                            col_is_valid_timeframe] if name == 'roles' else []))
+                        for name, table_columns in self.tables.items()}
+        self.rows = {name: EmploymentRoleColumns(table_columns, interned=interned_columns)
+                     for name, table_columns in self.tables.items()}
+        self.num_profiles = 0
+        self.num_employments = 0
+        self.num_rows = 0
+        self.num_batches = 0
+
+    @property
+    def tables_dir(self):
+        return f'{self.file_base}.tables'
+
+    def _to_frames(self, profile_offset=0, employment_offset=0):
+        frames = {}
+        for name, rows in self.rows.items():
+            frames[name] = rows.to_frame()
+            rows.clear()
+            for column, offset in ((col_profile_id, profile_offset), (col_employment_id, employment_offset)):
+                if column in frames[name].columns:
+                    frames[name][column] = frames[name][column].astype('int64') + offset
+        frames['roles'] = frames['roles'].join(parse_timeframes(frames['roles'][col_timeframe]))
+        return frames
+
+    def add(self, profile_rows, author_ids):
+        """
+        Add a profile to the next batch. Profiles without rows are skipped, as they are by :ExtractedProfileWriter
+        :param profile_rows: list of tuples with the values of the :columns, one per role
+        :param author_ids: iterable of the author IDs of the profile
+        """
+        if not profile_rows:
+            return
+        name, url, company_name, company_url, role, timeframe, location = self._positions
+        profile_id = self.num_profiles
+        self.num_profiles += 1
+        self.rows['profiles'].append((profile_id, profile_rows[0][name], profile_rows[0][url]))
+        for aid in author_ids:
+            self.rows['url_author'].append((aid, profile_id))
+
+        company = None
+        for profile_row in profile_rows:
+            if company != (profile_row[company_name], profile_row[company_url]):
+                company = profile_row[company_name], profile_row[company_url]
+                self.num_employments += 1
+                self.rows['employments'].append((self.num_employments - 1, profile_id, *company))
+            self.rows['roles'].append((self.num_employments - 1, profile_row[role], profile_row[timeframe],
+                                       profile_row[location]))
+
+    def write(self):
+        """
+        Write the profiles added since the last batch as a new batch of every table
+        """
+        if not len(self.rows['profiles']):
+            return
+        for name, df in self._to_frames().items():
+            _write_batch(df, join(self.tables_dir, name), self.formats, self.schemas[name], self.num_batches)
+            if name == 'roles':
+                self.num_rows += len(df)
+        self.num_batches += 1
+
+    def merge(self, urls):
+        """
+        Replace the profiles :urls in the tables written before, e.g. by an earlier run, with the profiles added. The
+        profiles replaced are removed with their employments, roles and author IDs, and the profiles added get new IDs
+        following the greatest IDs in the tables. Of the Parquet datasets, only the files holding rows of :urls are
+        rewritten and the profiles added are appended as a new file. CSV files are rewritten as a whole
+        :param urls: set of the URLs of the profiles extracted again, including the ones that yield no rows now. The
+        URLs of all profiles added must be in :urls
+        """
+        profiles = self._read_columns('profiles', [col_profile_id, col_URL])
+        employments = self._read_columns('employments', [col_employment_id, col_profile_id])
+        profile_ids = set(profiles.loc[profiles[col_URL].isin(urls), col_profile_id])
+        keys = {col_profile_id: profile_ids,
+                col_employment_id: set(employments.loc[employments[col_profile_id].isin(profile_ids), col_employment_id])}
+        frames = self._to_frames(profile_offset=int(profiles[col_profile_id].max()) + 1 if len(profiles) else 0,
+                                 employment_offset=int(employments[col_employment_id].max()) + 1
+                                 if len(employments) else 0)
+        for name, df in frames.items():
+            file_base = join(self.tables_dir, name)
+            key = col_employment_id if name == 'roles' else col_profile_id
+            if 'parquet' in self.formats:
+                parts = _get_parts(f'{file_base}.parquet')
+                rewritten = _remove_from_parts(parts, key, keys[key])
+                if len(df):
+                    _write_batch(df, file_base, ['parquet'], self.schemas[name], len(parts))
+                logging.info(f'MERGED: {rewritten} of {len(parts)} files of {file_base}.parquet rewritten')
+            if 'csv' in self.formats:
+                _merge_csv(f'{file_base}.csv', df, key, keys[key])
+            if name == 'roles':
+                self.num_rows += len(df)
+        self.num_batches += 1
+
+    def _read_columns(self, name, columns):
+        file_base = join(self.tables_dir, name)
+        if 'parquet' in self.formats and isdir(f'{file_base}.parquet'):
+            return pd.read_parquet(f'{file_base}.parquet', columns=columns)
+        if isfile(f'{file_base}.csv'):
+            return pd.read_csv(f'{file_base}.csv', usecols=columns, keep_default_na=False)
+        return pd.DataFrame({column: pd.Series(dtype='int64' if column != col_URL else object) for column in columns})
+
+    def get_outputs(self):
+        """
+        :return: list of paths to the files or folders written
+        """
+        return [self.tables_dir] if self.num_batches else []
+
+
+def _get_formats(formats):
+    formats = list(formats)
+    if 'parquet' in formats and pa is None:
+        logging.warning('MISSING_PACKAGE: pyarrow is not installed, the extracted profiles are only written as CSV')
+        formats = [fmt for fmt in formats if fmt != 'parquet'] or ['csv']
+    return formats
+
+
+def _get_schema(columns):
+    if pa is None:
+        return None
+    types = {col_AID: pa.int64(), col_profile_id: pa.int64(), col_employment_id: pa.int64(),
+             col_company_name: pa.dictionary(pa.int32(), pa.string()), col_start_month: pa.int32(),
+             col_end_month: pa.int32(), col_is_present: pa.bool_(), col_is_valid_timeframe: pa.bool_()}
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def _get_parts(parquet_dir):
+    return sorted(glob.glob(join(parquet_dir, 'part-*.parquet'))) if isdir(parquet_dir) else []
+
+
+def _write_batch(df, file_base, formats, schema, batch):
+    """
+    Append a batch of rows to the CSV file and/or Parquet dataset :file_base
+    ======================================================================================
+    :param df: pandas.DataFrame of the rows
+    :param file_base: path of the output without extension
+    :param formats: 'csv' and/or 'parquet'
+    :param schema: pyarrow.Schema of the Parquet files
+    :param batch: number of the batch, the first of which replaces the output of an earlier run within the same minute
+    """
+    if 'csv' in formats:
+        os.makedirs(os.path.dirname(file_base) or '.', exist_ok=True)
+        df.to_csv(f'{file_base}.csv', mode='a' if batch else 'w', header=batch == 0, index=False)
+    if 'parquet' in formats:
+        os.makedirs(f'{file_base}.parquet', exist_ok=True)
+        if not batch:
+            for part in _get_parts(f'{file_base}.parquet'):
+                os.remove(part)
+        _write_parquet(pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+                       join(f'{file_base}.parquet', f'part-{batch:05d}.parquet'))
+
+
+def _write_parquet(table, file_):
+    delta_encoded = [column for column in table.schema.names if column in delta_encoded_columns]
+    if not delta_encoded:
+        pq.write_table(table, file_)
+        return
+    pq.write_table(table, file_, use_dictionary=[column for column in table.schema.names if column not in delta_encoded],
+                   column_encoding={column: 'DELTA_BINARY_PACKED' for column in delta_encoded})
+
+
+def _remove_from_parts(parts, column, keys):
+    """
+    Remove the rows whose value of :column is one of :keys from the Parquet files :parts. Only the files whose range of
+    :column contains one of :keys are read and rewritten
+    ======================================================================================
+    :param parts: list of paths to Parquet files
+    :param column: name of the key column
+    :param keys: set of the keys of the rows to remove
+    :return: number of files rewritten
+    """
+    keys = sorted(keys)
+    rewritten = 0
+    for part in parts:
+        start, end = _get_column_range(part, column)
+        if start is None or bisect_left(keys, start) == bisect_right(keys, end):
+            continue
+        table = pq.read_table(part)
+        value_set = pa.array(keys, type=table.schema.field(column).type)
+        table = table.filter(pc.invert(pc.is_in(table.column(column), value_set=value_set)))
+        _write_parquet(table, f'{part}.tmp')
+        os.replace(f'{part}.tmp', part)
+        rewritten += 1
+    return rewritten
+
+
+def _merge_csv(csv_file, df, column, keys, sort=False):
+    """
+    Replace the rows whose value of :column is one of :keys in a CSV file with the rows :df
+    ======================================================================================
+    :param csv_file: path to the CSV file, which is created if it does not exist
+    :param df: pandas.DataFrame of the new rows
+    :param column: name of the key column
+    :param keys: set of the keys of the rows to replace
+    :param sort: If True, sort the rows by :column, keeping the order of rows with the same key
+    """
+    # rows are compared and sorted as text, so that the rows kept are written back unchanged
+    new_rows = pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str, keep_default_na=False)
+    if isfile(csv_file):
+        old_rows = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+        new_rows = pd.concat([old_rows[~old_rows[column].isin({str(key) for key in keys})], new_rows[old_rows.columns]],
+                             ignore_index=True)
+        if sort:
+            new_rows = new_rows.sort_values(column, kind='stable')
+    new_rows.to_csv(f'{csv_file}.tmp', index=False)
+    os.replace(f'{csv_file}.tmp', csv_file)
+
+
+def _get_column_range(part, column):
+    """
+    :param part: path to a Parquet file
+    :param column: name of a column of :part
+    :return: (smallest value, largest value) of :column in :part, read from the statistics of the file if available,
+    or (None, None) if :part has no rows
+    """
+    metadata = pq.ParquetFile(part).metadata
+    if metadata.num_rows == 0:
+        return None, None
+    index = metadata.schema.names.index(column)
+    statistics = [metadata.row_group(i).column(index).statistics for i in range(metadata.num_row_groups)]
+    if all(stat is not None and stat.has_min_max for stat in statistics):
+        return min(stat.min for stat in statistics), max(stat.max for stat in statistics)
+    values = pq.read_table(part, columns=[column]).column(column)
+    return pc.min(values).as_py(), pc.max(values).as_py()
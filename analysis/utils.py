@@ -3,20 +3,31 @@ CONTAIN FUNCTIONS THAT CAN BE REUSED BY MULTIPLE SCRIPTS
 """
 
 import glob
+import logging
 import os
+import pickle
 import re
 from collections import defaultdict
 from datetime import datetime
-from os.path import join
+from os.path import basename, isfile, join
 
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet input and output are optional
+    pa = pc = pq = None
+
 str_sep = ' | '
 tframe_sep = ' - '
 special_hyphen = ' – '  # this is not an ordinary hyphen, it's from html files
 
 col_URL = 'L---e---Link'
 col_AID = 'author_id'
+col_profile_id = 'Profile_ID'
+col_employment_id = 'Employment_ID'
 col_employee_name = 'Employee_Name'
 
 col_company_name = 'Company_Name'
@@ -24,6 +35,10 @@ col_company_url = 'Company_URL'
 col_role = 'Role'
 col_timeframe = 'Timeframe'
 col_location = 'Location'
+col_start_month = 'Start_Month'
+col_end_month = 'End_Month'
+col_is_present = 'Is_Present'
+col_is_valid_timeframe = 'Is_Valid_Timeframe'
 
 col_cur_employer = 'cur_employer'
 col_cur_job_start = 'cur_job_start'
@@ -77,26 +92,158 @@ def get_now():
     return pd.to_datetime('today').strftime('%Y_%m_%d_%H_%M')
 
 
-def _get_U2A_or_A2U_mappings(csv_dir, k, v):
+def _group_values(keys, values):
     """
-    Get mappings from L---e--- profile URLs to author ID or vice versa
+    Group values by their keys, keeping keys with a single value apart so that no set is built for them
     ======================================================================================
     Args:
-        csv_dir (str): path to folder storing csv files listing all URLs and author IDs
-        k (str): the column name that is the key of the mappings, either :col_AID or :col_URL
-        v (str): the column name that is the value of the mappings, either :col_AID or :col_URL
+        keys (list): the keys, one per value
+        values (list): the values
+
     Returns:
-        dict[k -> set(v)]
+        (dict[key -> value], dict[key -> set(value)]) for the keys with a single value and with several values
+    """
+    singles = dict(zip(keys, values))
+    multiples = {}
+    if len(singles) < len(keys):
+        is_multiple = pd.Series(keys, dtype=object).duplicated(keep=False).to_numpy()
+        for key, value, multiple in zip(keys, values, is_multiple):
+            if multiple:
+                multiples.setdefault(key, set()).add(value)
+                singles.pop(key, None)
+    return singles, multiples
+
+
+class URLAuthorMappings:
     """
-    df = pd.DataFrame(columns=[col_AID, col_URL])
-    for csv_file in glob.glob(join(csv_dir, '*_filtered*.csv')):
-        _df = pd.read_csv(csv_file, delimiter=',', header=0, usecols=[col_AID, col_URL], dtype={col_AID: int})
-        df = df.append(_df, ignore_index=True)
+    Mappings between L---e--- profile URLs and author IDs listed in the filtered csv files of a folder. They are only
+    loaded on first use, and kept in a pickle file next to the csv files, which is rebuilt as soon as a csv file is
+    added, removed or modified. Use :get_url_author_mappings to share one instance per folder.
+    """
+    cache_name = '.url_author_mappings.pickle'
+
+    def __init__(self, csv_dir):
+        """
+        Args:
+            csv_dir (str): path to folder storing csv files listing all URLs and author IDs
+        """
+        self.csv_dir = csv_dir
+        self.cache_file = join(csv_dir, self.cache_name)
+        self._mappings = None
+
+    def _get_sources(self):
+        """
+        Returns:
+            sorted list of (file name, size, modification time in ns) of the filtered csv files
+        """
+        sources = []
+        for csv_file in glob.glob(join(self.csv_dir, '*_filtered*.csv')):
+            stat = os.stat(csv_file)
+            sources.append((basename(csv_file), stat.st_size, stat.st_mtime_ns))
+        return sorted(sources)
+
+    def _build(self, sources):
+        """
+        Read the filtered csv files and group URLs and author IDs in both directions
+        ======================================================================================
+        Args:
+            sources (list): the csv files by :_get_sources
+
+        Returns:
+            dict of the mappings to be cached
+        """
+        frames = [pd.read_csv(join(self.csv_dir, csv_file), delimiter=',', header=0, usecols=[col_AID, col_URL])
+                  for csv_file, _, _ in sources]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[col_AID, col_URL])
+        df = df.dropna().drop_duplicates()
+        urls, aids = df[col_URL].tolist(), df[col_AID].astype('int64').tolist()
+        return {'sources': sources, 'url_aid': _group_values(urls, aids), 'aid_url': _group_values(aids, urls)}
+
+    def is_stale(self):
+        """
+        Returns:
+            True if the mappings have been loaded and the filtered csv files have changed since
+        """
+        return self._mappings is not None and self._mappings['sources'] != self._get_sources()
+
+    def _load(self):
+        """
+        Returns:
+            the mappings, read from the cache file on first use and rebuilt if the filtered csv files have changed since
+            they were cached
+        """
+        if self._mappings is not None:
+            return self._mappings
+
+        sources = self._get_sources()
+
+        if isfile(self.cache_file):
+            try:
+                with open(self.cache_file, 'rb') as file:
+                    mappings = pickle.load(file)
+                if mappings['sources'] == sources:
+                    self._mappings = mappings
+                    return mappings
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError) as e:
+                logging.warning(f'CACHE_INVALID: {self.cache_file} cannot be read ({e}), rebuilding it')
+
+        self._mappings = self._build(sources)
+        try:
+            with open(f'{self.cache_file}.tmp', 'wb') as file:
+                pickle.dump(self._mappings, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f'{self.cache_file}.tmp', self.cache_file)
+        except OSError as e:
+            logging.warning(f'CACHE_NOT_SAVED: {self.cache_file} cannot be written ({e})')
+        return self._mappings
+
+    def get_author_ids(self, url):
+        """
+        Args:
+            url (str): L---e--- profile URL
+
+        Returns:
+            set of the author IDs listed with :url, empty if :url is not listed
+        """
+        singles, multiples = self._load()['url_aid']
+        return {singles[url]} if url in singles else set(multiples.get(url, ()))
+
+    def get_urls(self, aid):
+        """
+        Args:
+            aid (int): author ID
+
+        Returns:
+            set of the L---e--- profile URLs listed with :aid, empty if :aid is not listed
+        """
+        singles, multiples = self._load()['aid_url']
+        return {singles[aid]} if aid in singles else set(multiples.get(aid, ()))
+
+    def get_all_urls(self):
+        """
+        Returns:
+            set of all L---e--- profile URLs listed
+        """
+        singles, multiples = self._load()['url_aid']
+        return set(singles).union(multiples)
+
+
+_url_author_mappings = {}
+
+
+def get_url_author_mappings(csv_dir):
+    """
+    Get the shared :URLAuthorMappings of a folder of filtered csv files
+    ======================================================================================
+    Args:
+        csv_dir (str): path to folder storing csv files listing all URLs and author IDs
 
-    mappings = defaultdict(set)
-    for i, row in df.iterrows():
-        mappings[row[k]].add(row[v])
-    return mappings
+    Returns:
+        the :URLAuthorMappings of :csv_dir, which loads the mappings on first use
+    """
+    key = os.path.abspath(csv_dir)
+    if key not in _url_author_mappings or _url_author_mappings[key].is_stale():
+        _url_author_mappings[key] = URLAuthorMappings(csv_dir)
+    return _url_author_mappings[key]
 
 
 def get_URL_AID_mappings(csv_dir):
@@ -107,9 +254,12 @@ def get_URL_AID_mappings(csv_dir):
         csv_dir (str): path to folder storing csv files listing all URLs and author IDs
 
     Returns:
-        dict[url -> aid]
+        dict[url -> set(aid)]
     """
-    return _get_U2A_or_A2U_mappings(csv_dir, k=col_URL, v=col_AID)
+    singles, multiples = get_url_author_mappings(csv_dir)._load()['url_aid']
+    mappings = defaultdict(set, {url: {aid} for url, aid in singles.items()})
+    mappings.update((url, set(aids)) for url, aids in multiples.items())
+    return mappings
 
 
 def get_AID_URL_mappings(csv_dir):
@@ -120,9 +270,25 @@ def get_AID_URL_mappings(csv_dir):
         csv_dir (str): path to folder storing csv files listing all URLs and author IDs
 
     Returns:
-        dict[aid -> url]
+        dict[aid -> set(url)]
     """
-    return _get_U2A_or_A2U_mappings(csv_dir, k=col_AID, v=col_URL)
+    singles, multiples = get_url_author_mappings(csv_dir)._load()['aid_url']
+    mappings = defaultdict(set, {aid: {url} for aid, url in singles.items()})
+    mappings.update((aid, set(urls)) for aid, urls in multiples.items())
+    return mappings
+
+
+def get_profile_urls(csv_dir):
+    """
+    Get all L---e--- profile URLs listed in the filtered csv files
+    ======================================================================================
+    Args:
+        csv_dir (str): path to folder storing csv files listing all URLs and author IDs
+
+    Returns:
+        set(url)
+    """
+    return get_url_author_mappings(csv_dir).get_all_urls()
 
 
 def get_file_name(filepath):
@@ -174,6 +340,82 @@ def parse_employment_timeframe(timeframe_str):
     return start, end
 
 
+_MONTH_ABBREVIATIONS = {month: i for i, month in
+                        enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+
+
+def to_month_ordinal(date):
+    """
+    Convert a date to the number of months since year 0, e.g. Jan 2015 -> 2015 * 12
+    ======================================================================================
+    Args:
+        date (datetime): datetime object
+
+    Returns:
+        (int): the month ordinal
+    """
+    return date.year * 12 + date.month - 1
+
+
+def from_month_ordinal(month_ordinal):
+    """
+    Convert a month ordinal from :to_month_ordinal back to the first day of that month
+    ======================================================================================
+    Args:
+        month_ordinal (int): the month ordinal
+
+    Returns:
+        datetime object of the first day of the month
+    """
+    return datetime(int(month_ordinal) // 12, int(month_ordinal) % 12 + 1, 1)
+
+
+def _parse_month_ordinals(date_strs, now_month):
+    """
+    Vectorized counterpart of :_parse_month_year, returning month ordinals instead of datetime objects
+    ======================================================================================
+    Args:
+        date_strs (pandas.Series): date strings in '%b %Y' or '%Y' format, or 'Present'
+        now_month (int): the month ordinal 'Present' stands for
+
+    Returns:
+        (pandas.Series): nullable month ordinals, null for strings that cannot be parsed
+    """
+    month_year = date_strs.str.extract(r'^([A-Za-z]{3})\s+(\d{4})$')
+    month = month_year[0].str.lower().map(_MONTH_ABBREVIATIONS)
+    has_space = date_strs.str.contains(' ', regex=False)
+    year = month_year[1].where(has_space, date_strs.where(date_strs.str.fullmatch(r'\d{4}')))
+    ordinals = pd.to_numeric(year) * 12 + month.where(has_space, 0)
+    return ordinals.mask(date_strs == 'Present', now_month).astype('Int32')
+
+
+def parse_timeframes(timeframes):
+    """
+    Vectorized counterpart of :parse_employment_timeframe, parsing employment timeframe strings to the month ordinals
+    (see :to_month_ordinal) of their start and end in a single pass over all rows
+    ======================================================================================
+    Args:
+        timeframes (pandas.Series): timeframe strings, e.g. 'Jan 2015 - Present'
+
+    Returns:
+        (pandas.DataFrame): with the index of :timeframes and the columns
+            :col_start_month, :col_end_month: nullable month ordinals of start and end. 'Present' is the current month
+            :col_is_present (bool): whether the end is 'Present', i.e. the month the timeframe is used in
+            :col_is_valid_timeframe (bool): False for timeframes :parse_employment_timeframe cannot parse, whose
+                                            month ordinals are null
+    """
+    now_month = to_month_ordinal(datetime.now())
+    parts = timeframes.fillna('').astype(str).str.split(tframe_sep, expand=True).reindex(columns=[0, 1])
+    parts = parts.apply(lambda part: part.str.replace(r'[^\w\s]', '', regex=True))
+    start = _parse_month_ordinals(parts[0], now_month)
+    end = _parse_month_ordinals(parts[1], now_month)
+    is_valid = start.notna() & end.notna()
+    return pd.DataFrame({col_start_month: start.where(is_valid),
+                         col_end_month: end.where(is_valid),
+                         col_is_present: is_valid & (parts[1] == 'Present'),
+                         col_is_valid_timeframe: is_valid}, index=timeframes.index)
+
+
 def set_day_to_1(date):
     """
     Set the day value of a datetime object to 1
@@ -203,5 +445,105 @@ def parse_acquisition_date(acq_date):
     return _acq_date
 
 
+def save_table(df, file_base, formats=('csv',), types=None):
+    """
+    Save a DataFrame as CSV file and/or as Parquet file with an explicit schema
+    ======================================================================================
+    Args:
+        df (pandas.DataFrame): the DataFrame to be saved
+        file_base (str): path of the output without extension
+        formats (list[str]): 'csv' and/or 'parquet'. Parquet output requires pyarrow, otherwise CSV is written instead
+        types (dict[str -> pyarrow.DataType]): type of each column in the Parquet file. Other columns are strings
+
+    Returns:
+        (list[str]): paths to the files written
+    """
+    if 'parquet' in formats and pa is None:
+        logging.warning('MISSING_PACKAGE: pyarrow is not installed, falling back to CSV')
+        formats = [fmt for fmt in formats if fmt != 'parquet'] or ['csv']
+
+    files = []
+    if 'parquet' in formats:
+        types = types or {}
+        schema = pa.schema([(column, types.get(column, pa.string())) for column in df.columns])
+        pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), f'{file_base}.parquet')
+        files.append(f'{file_base}.parquet')
+    if 'csv' in formats:
+        df.to_csv(f'{file_base}.csv', index=False)
+        files.append(f'{file_base}.csv')
+    return files
+
+
+def find_latest_table(file_pattern):
+    """
+    Find the newest output of a pipeline step. Outputs are named with a :get_now suffix, so the newest one has the
+    greatest file name. Parquet is preferred over CSV when both exist for the same run
+    ======================================================================================
+    Args:
+        file_pattern (str): glob pattern of the outputs without extension, e.g. .../group__extracted_profiles_*
+
+    Returns:
+        (str): path to the newest Parquet file/folder or CSV file, or None if there is none
+    """
+    files = glob.glob(f'{file_pattern}.parquet') + glob.glob(f'{file_pattern}.csv')
+    return max(files, key=lambda file_: (get_file_name(file_), file_.endswith('.parquet'))) if files else None
+
+
+def find_latest_extracted_profiles(file_pattern):
+    """
+    Find the newest extracted profiles, either a single table (see :find_latest_table) or a folder of relational
+    tables written by the extractor with OUTPUT_LAYOUT = 'relational'
+    ======================================================================================
+    Args:
+        file_pattern (str): glob pattern of the outputs without extension, e.g. .../group__extracted_profiles_*
+
+    Returns:
+        (str): path to the newest Parquet file/folder, CSV file or .tables folder, or None if there is none
+    """
+    files = glob.glob(f'{file_pattern}.tables')
+    table = find_latest_table(file_pattern)
+    if table is not None:
+        files.append(table)
+    return max(files, key=get_file_name) if files else None
+
+
+def find_table(file_base):
+    """
+    Find a table saved by :save_table or the extractor in any format, preferring Parquet over CSV
+    ======================================================================================
+    Args:
+        file_base (str): path of the table without extension
+
+    Returns:
+        (str): path to the Parquet file/folder or CSV file, or None if there is none
+    """
+    for file_ in (f'{file_base}.parquet', f'{file_base}.csv'):
+        if os.path.exists(file_):
+            return file_
+    return None
+
+
+def read_table(file_, dtype=None):
+    """
+    Read a CSV file or a Parquet file/folder written by :save_table or the extractor
+    ======================================================================================
+    Args:
+        file_ (str): path to the CSV or Parquet file/folder
+        dtype (dict): types of the columns of a CSV file, as for pandas.read_csv
+
+    Returns:
+        (pandas.DataFrame): the table read, with empty strings instead of missing strings like a CSV file read with
+        keep_default_na=False
+    """
+    if file_.endswith('.parquet'):
+        df = pd.read_parquet(file_)
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].fillna('')
+    else:
+        df = pd.read_csv(file_, delimiter=',', header=0, dtype=dtype, keep_default_na=False)
+    return df
+
+
 class InvalidTimeframeException(Exception):
     pass
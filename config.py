@@ -27,14 +27,56 @@ class SCRAPING_SUBDIRS:
 
 
 class URL_FILTER_PARAMS:
+    # 'filter': filter duplicate URLs
+    # 'rebuild_index' / 'verify_index': rebuild the URL index from / verify it against the filtered CSV files
+    # any other value: scan for invalid mappings between author_id's and URLs in SCAN_DIR
     RUN_OPTION = 'filter'
+
+    # 'ovm': compare each CSV file against all previously filtered files (One vs. Many), one file after another
+    # 'global': read all CSV files once and filter them against a single URL index in one pass
+    # 'incremental': filter only CSV files not seen before against the persistent URL index at URL_INDEX_FILE
+    # 'stream': read CSV files in chunks of CHUNK_SIZE rows and keep only URL fingerprints in memory (for huge URL lists)
+    FILTER_MODE = 'ovm'
+    CHUNK_SIZE = 100000
+
+    # number of worker processes to read and format the URL CSV files with, can be overridden by `--jobs N`. Not used by
+    # the 'stream' mode
+    JOBS = 1
+
     PROFILE_DIR = join(SCRAPING_SUBDIRS.URLS, 'original')
     SAVE_DIR = join(SCRAPING_SUBDIRS.URLS, 'filtered')
     INTER_DUPLICATE_DIR = join(SCRAPING_SUBDIRS.URLS, 'inter_duplicates')
 
+    # SQLite file recording every canonical URL accepted into the filtered CSV files
+    URL_INDEX_FILE = join(SCRAPING_SUBDIRS.URLS, 'url_index.sqlite')
+
     SCAN_DIR = join(PROFILE_DIR)
 
 
+class URL_FILTER_BENCHMARK_PARAMS:
+    # shape of the synthetic corpus of URL CSV files
+    NUM_FILES = 10
+    ROWS_PER_FILE = 100000
+    INTRA_DUPLICATE_RATE = 0.05
+    INTER_DUPLICATE_RATE = 0.2
+    # share of URLs with a query string, locale suffix or tailing backslash
+    MALFORMED_RATE = 0.1
+    SEED = 0
+
+    # URL_FILTER_PARAMS.FILTER_MODE values to time ('ovm' takes quadratic time in the number of files)
+    FILTER_MODES = ['global', 'stream', 'incremental']
+    # worker counts to time the 'global' and 'incremental' modes and the AID/URL conflict scan with
+    JOBS = [1, 4]
+
+    # row counts of the single synthetic frame to time count_intra_duplicate_urls + filter_intra_duplicate_urls on, with
+    # INTRA_DUPLICATE_RATE duplicate rows. The previous row-by-row implementation is only timed up to
+    # INTRA_DUPLICATE_OLD_MAX_ROWS rows, as it already takes minutes for 1e5 rows
+    INTRA_DUPLICATE_ROWS = [100000, 1000000, 10000000]
+    INTRA_DUPLICATE_OLD_MAX_ROWS = 100000
+
+    RESULTS_DIR = join(SCRAPING_SUBDIRS.LOGS, 'benchmarks')
+
+
 class ACCOUNT_SIGNUP_ASSISTANT_PARAMS:
     ACC_COUNT = 2
     ACC_SAVE_DIR = SCRAPING_SUBDIRS.SETTINGS
@@ -60,7 +102,8 @@ class SCRAPER_PARAMS:
 class VALIDATOR_PARAMS:
     TARGET_GROUP = CUR_GROUP
 
-    # path to the folder where the profiles are stored as HTML files
+    # path to the folder where the profiles are stored as HTML files, or to a .zip, .tar, .tar.gz, .tar.bz2, .tar.xz or
+    # .tar.zst archive of them (.tar.zst requires zstandard)
     TARGET_DIR = SCRAPER_PARAMS.SAVE_DIR
 
     # path to the folder where the csv file outlining faulty or missing profiles should be stored
@@ -72,6 +115,26 @@ class VALIDATOR_PARAMS:
     # path to the CSV file listing all URls to unavailable profiles
     UNAVAILABLE_PROFILES_FILE = SCRAPER_PARAMS.UNAVAILABLE_PROFILES_FILE
 
+    # 'regex': classify faulty pages by scanning their raw bytes, 'bsoup': by building a BeautifulSoup tree (slow)
+    PAGE_CLASSIFIER = 'regex'
+
+    # If > 0, compare the verdicts of both classifiers on that many randomly sampled pages before validating. The regex
+    # classifier does not tell apart tags inside comments or scripts, so keep a small sample on for every new corpus
+    VERIFY_CLASSIFIER_SAMPLE_SIZE = 100
+
+    # number of worker processes inspecting the profile pages, and number of pages dispatched to a worker at once
+    JOBS = 1
+    CHUNK_SIZE = 500
+
+    # If TARGET_DIR is an archive: number of pages a background thread reads and decompresses ahead of the inspection,
+    # or 0 to read the archive without a thread
+    PREFETCH = 1000
+
+    # If True, keep size, modification time, content hash and verdict of every inspected page in MANIFEST_FILE, so that
+    # later runs only inspect new or modified pages. Switching PAGE_CLASSIFIER invalidates the recorded verdicts
+    USE_MANIFEST = True
+    MANIFEST_FILE = join(SCRAPING_SUBDIRS.SETTINGS, f'{TARGET_GROUP}__validation_manifest.csv')
+
 
 ########################################################################################################################
 
@@ -86,23 +149,72 @@ class ANALYSIS_SUBDIRS:
 class EXTRACTOR_PARAMS:
     TARGET_GROUP = CUR_GROUP
 
-    # Folder where the profile html files locate
+    # Folder where the profile html files locate, or a .zip, .tar, .tar.gz, .tar.bz2, .tar.xz or .tar.zst archive of them
+    # (.tar.zst requires zstandard)
     PROFILE_DIR = SCRAPER_PARAMS.SAVE_DIR
     URLS_DIR = join(SCRAPING_SUBDIRS.URLS, f'_{TARGET_GROUP}')
 
     FAUTY_PROFILES_DIR = join(ANALYSIS_SUBDIRS.EXTRACTED_DATA, 'faulty')
-    # path to csv file that contains faulty html paths
+    # path to the append-only log (JSON Lines) of the changes of the html pages found faulty or resolved, with a
+    # snapshot of their state kept in FAULTY_LOG_FILE.state. Compact or export it with `python -m analysis.faulty_log --compact` or
+    # `--export <csv file>`
+    FAULTY_LOG_FILE = join(FAUTY_PROFILES_DIR, f'{TARGET_GROUP}__faulty_pages.jsonl')
+    # path to csv file that contains faulty html paths, written by earlier versions. Imported into FAULTY_LOG_FILE once
     FAULTY_PROFILES_CSV = join(FAUTY_PROFILES_DIR, f'{TARGET_GROUP}__faulty_pages.csv')
 
-    # If True: continue where left off from the most recent run by reading the extracted profiles from the latest csv file {profile_dir}/faulty_pages*.csv.
-    # If False: running from scratch (without reading the last extracted profiles obtained from the recent run)
-    CONTINUE_LAST_RUN = False
+    # If True, keep the rows extracted from every page together with its size, modification time and content hash in
+    # CACHE_FILE, so that later runs only extract new or modified pages and take the others from the cache.
+    # If False: extracting all pages from scratch
+    USE_CACHE = True
+    CACHE_FILE = join(ANALYSIS_SUBDIRS.EXTRACTED_DATA, f'{TARGET_GROUP}__extraction_cache.sqlite')
 
-    # If True, only the set of faulty profile pages listed in the csv file located at :paths_faulty_prev will be extracted.
+    # If True, keep only the parts of every page the extractor reads (the name heading the main.core-rail and the
+    # section#experience-section, a few kilobytes per page) compressed in FRAGMENT_FILE, so that pages extracted again,
+    # e.g. after CACHE_FILE has been deleted to apply a change to the extraction, are not read and parsed as a whole.
+    # Delete FRAGMENT_FILE if the extraction is changed to read other parts of the pages
+    USE_FRAGMENTS = False
+    FRAGMENT_FILE = join(ANALYSIS_SUBDIRS.EXTRACTED_DATA, f'{TARGET_GROUP}__page_fragments.sqlite')
+
+    # If True, only the set of profile pages currently faulty in FAULTY_LOG_FILE will be extracted.
     # Since the extraction process takes quite long, this param is useful to inspect only a subset of faulty profiles
     RUN_PREV_FAULTY = False
+    # Profile URLs and author IDs whose pages are the only ones to be extracted, e.g. after they have been scraped again.
+    # Can be overridden by `--urls`, `--author-ids` and `--faulty`. Targeted profiles (incl. RUN_PREV_FAULTY) replace
+    # their rows in the newest extracted profiles, of which only the Parquet files holding them are rewritten
+    TARGET_URLS = []
+    TARGET_AUTHOR_IDS = []
+
+    # BeautifulSoup tree builder parsing the profile pages: 'lxml' (fast, falls back to 'html.parser' if not installed),
+    # 'html.parser' or 'html5lib'
+    HTML_PARSER = 'lxml'
+
+    # If True, only build the subtrees of the <main> and <section> elements of a page instead of the whole page tree
+    RESTRICTED_PARSE = True
 
-    make_dirs([PROFILE_DIR, FAUTY_PROFILES_DIR])
+    # If > 0, compare the profiles extracted by HTML_PARSER and RESTRICTED_PARSE with the ones extracted from the whole
+    # page tree built by 'html.parser' on that many randomly sampled pages before extracting. The faster defaults above
+    # are only safe as long as they extract the same profiles, so keep a small sample on for every new corpus
+    VERIFY_PARSER_SAMPLE_SIZE = 100
+
+    # number of worker processes extracting the profile pages, and number of pages dispatched to a worker at once
+    JOBS = 1
+    CHUNK_SIZE = 100
+
+    # If PROFILE_DIR is an archive: number of pages a background thread reads and decompresses ahead of the extraction,
+    # or 0 to read the archive without a thread
+    PREFETCH = 1000
+
+    # Formats of the extracted profiles: 'parquet' (a folder of Parquet files with typed columns, requires pyarrow, falls
+    # back to 'csv' if not installed) and/or 'csv'. The rows extracted are appended to the output every WRITE_BATCH_SIZE
+    # pages
+    OUTPUT_FORMATS = ['parquet']
+    WRITE_BATCH_SIZE = 1000
+    # 'rows': one table with a row per role and author ID of a profile, repeating the profile for every author ID
+    # 'relational': a folder of the tables profiles, employments, roles and url_author linked by integer IDs, storing
+    # every profile once whatever the number of its author IDs. The inspector reads both
+    OUTPUT_LAYOUT = 'rows'
+
+    make_dirs([dir_ for dir_ in [PROFILE_DIR, FAUTY_PROFILES_DIR] if not isfile(dir_)])
 
 
 class INSPECTOR_PARAMS:
@@ -113,6 +225,10 @@ class INSPECTOR_PARAMS:
     FAULTY_EMPLOYEES_DIR = join(ANALYSIS_SUBDIRS.FINAL_DATA, 'faulty')
     NONE_MATCHED_DIR = join(ANALYSIS_SUBDIRS.FINAL_DATA, 'none_matched')
 
+    # Formats of the results: 'parquet' (typed columns, requires pyarrow) and/or 'csv', which the notebook
+    # 'Analysis for Job Transition Pattern by Acquisitions' reads
+    OUTPUT_FORMATS = ['parquet', 'csv']
+
     make_dirs([FINAL_DATA_DIR, FAULTY_EMPLOYEES_DIR, NONE_MATCHED_DIR])
 
 
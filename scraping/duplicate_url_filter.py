@@ -1,10 +1,14 @@
+import argparse
 import logging
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from os.path import isfile, isdir, exists, join, basename, splitext
 import shutil
 
 # print('__file__={0:<35} | __name__={1:<20} | __package__={2:<20}'.format(__file__, __name__, str(__package__)))
 from scraping.utils import *
+from scraping.url_index import URLIndex, FingerprintSet, fingerprint_urls, get_file_stats, rebuild_url_index, \
+    verify_url_index
 from config import URL_FILTER_PARAMS as PARAM
 
 tup_name = 'Profile'
@@ -35,20 +39,14 @@ def _format_profile_urls(df, idc):
     Returns:
         (pandas.DataFrame): The resulting pandas.DataFrame containing the formatted profile URLs
     """
-    for i, row in df.iterrows():
-        url = row[col_URL]
-        profile_name = parse_profile_name(url)
-        if "?" in profile_name:
-            idc.invalid_urls[url] = 1 if not idc.invalid_urls.get(url) else (idc.invalid_urls.get(url) + 1)
-            profile_name = strip_query(profile_name)
-        if "/" in profile_name:
-            profile_name = strip_locale(profile_name)
-        elif not profile_name:
-            idc.invalid_urls[url] = 1 if not idc.invalid_urls.get(url) else (idc.invalid_urls.get(url) + 1)
-
-        if profile_name:
-            row[col_URL] = f"https://www.l---e---.com/in/{profile_name}"
+    normalized, invalid_counts = normalize_profile_urls(df[col_URL])
+    is_invalid = invalid_counts > 0
+    if is_invalid.any():
+        per_url = invalid_counts[is_invalid].groupby(df.loc[is_invalid, col_URL], sort=False).sum()
+        for url, count in per_url.items():
+            idc.invalid_urls[url] += int(count)
 
+    df[col_URL] = normalized
     logging.info(f'DONE_FORMATTING: {len(df)} entries formatted')
     return df
 
@@ -68,9 +66,29 @@ class IntraDuplicateCounter:
         self.intra_duplicates = count_intra_duplicate_urls(self.df)
 
 
+def _count_intra_duplicates(csv_files, jobs=1):
+    """
+    Reads, formats and counts intra-duplicate URLs of CSV files, which is independent per file. With :jobs > 1, the
+    files are processed in a pool of worker processes, otherwise one after another as they are consumed.
+
+    Args:
+        csv_files (list[str]): paths to the CSV files containing profile URLs
+        jobs (int): number of worker processes
+
+    Returns:
+        (iterator[IntraDuplicateCounter]): one IntraDuplicateCounter per file, in the order of :csv_files
+    """
+    if jobs <= 1 or len(csv_files) <= 1:
+        yield from map(IntraDuplicateCounter, csv_files)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(csv_files))) as executor:
+        yield from executor.map(IntraDuplicateCounter, csv_files)
+
+
 def filter_intra_duplicate_urls(df, intra_duplicate_URLs):
     """
-    Removes all duplicate profile URLs WITHIN a pandas.DataFrame from it
+    Removes all duplicate profile URLs WITHIN a pandas.DataFrame from it. For a URL with n extra occurrences, its first
+    n rows are removed, so the last occurrence is the one kept.
 
     Args:
         df (pandas.DataFrame): The pandas.DataFrame whose duplicate URLs should be removed/filtered
@@ -79,13 +97,9 @@ def filter_intra_duplicate_urls(df, intra_duplicate_URLs):
     Returns:
         (pandas.DataFrame): The pandas.DataFrame without any duplicate URLs
     """
-    _intra_duplicates = intra_duplicate_URLs.copy()
-    for i, row in df.iterrows():
-        url = row[col_URL]
-        if _intra_duplicates.get(url) and _intra_duplicates.get(url) > 0:
-            df.drop(i, inplace=True)
-            _intra_duplicates[url] -= 1
-    return df
+    num_to_drop = df[col_URL].map(intra_duplicate_URLs).fillna(0)
+    occurrence = df.groupby(col_URL, sort=False, dropna=False).cumcount()
+    return df[occurrence >= num_to_drop]
 
 
 def count_intra_duplicate_urls(df):
@@ -98,17 +112,9 @@ def count_intra_duplicate_urls(df):
     Returns:
         (dict[str -> int]): The dict mapping duplicate profile URLs to the number of its occurrences
     """
-    duplicates = {}
-    _df = df.sort_values(col_URL)
-    for i in range(len(_df)):
-        if i == 0:
-            continue
-        cur_row = _df.iloc[i]
-        prev_row = _df.iloc[i - 1]
-        if cur_row[col_URL] == prev_row[col_URL]:
-            key = cur_row[col_URL]
-            duplicates[key] = 1 if duplicates.get(key) is None else (duplicates.get(key) + 1)
-    return duplicates
+    occurrences = df[col_URL].value_counts()
+    duplicates = occurrences[occurrences > 1].sort_index() - 1
+    return {url: int(count) for url, count in duplicates.items()}
 
 
 def intersect_tuples(target_tuples, template_tuples):
@@ -151,6 +157,22 @@ def _generate_URL_files(target_csv, unique_tups, duplicate_tups):
                                    } for tup in duplicate_tups],
                                  columns=[col_AID, col_URL])
 
+    return _write_URL_files(target_csv, df_uniques, df_duplicates)
+
+
+def _write_URL_files(target_csv, df_uniques, df_duplicates):
+    """
+    Writes the unique L---e--- profile URLs of a target CSV file into :PARAM.SAVE_DIR and its inter-duplicate URLs
+    into :PARAM.INTER_DUPLICATE_DIR
+
+    Args:
+        target_csv (str): path to the CSV file containing URLs that needs to be verified for duplicates
+        df_uniques (pandas.DataFrame): The pandas.DataFrame of unique L---e--- profile URLs
+        df_duplicates (pandas.DataFrame): The pandas.DataFrame of duplicate L---e--- profile URLs
+
+    Returns:
+        (bool): If True, the two files of unique and duplicate URLs have been successfully created, False otherwise
+    """
     file_name = parse_filename(target_csv)
     is_created = False
     i = 0
@@ -204,7 +226,7 @@ def _verify_filtering_results(target_df, others_df, unique_tups, duplicate_tups)
     assert set([eval(f'tup.{col_URL}') for tup in duplicate_tups]) == duplicates
 
 
-def _filter_duplicate_urls_OvM(target_csv):
+def _filter_duplicate_urls_OvM(target_csv, idc=None):
     """
     Filters out duplicate profile urls in a target CSV file by comparing its URLs against all other URls
     in other CSV files located in the same folder (One vs. Many comparisons).
@@ -212,12 +234,15 @@ def _filter_duplicate_urls_OvM(target_csv):
 
     Args:
         target_csv (str): path to the target CSV file containing URLs that needs to be verified for duplicates
+        idc (IntraDuplicateCounter): The IntraDuplicateCounter of :target_csv if it has been read already, e.g. by a
+                                     worker process of :_count_intra_duplicates
 
     Returns:
         (bool): If True, a new CSV file without duplicate URLs has been created successfully, False otherwise
     """
 
-    idc = IntraDuplicateCounter(target_csv)
+    if idc is None:
+        idc = IntraDuplicateCounter(target_csv)
 
     target_df = idc.df.copy()
 
@@ -243,13 +268,210 @@ def _filter_duplicate_urls_OvM(target_csv):
     return _generate_URL_files(target_csv, unique_tups, duplicate_tups)
 
 
+def _filter_duplicate_urls_globally(csv_files, jobs=1):
+    """
+    Filters out duplicate profile URLs of all CSV files in a single pass. Every file is read once and, after removing
+    its intra-duplicates, contributes to one index mapping each URL to the first (file, author_id) it appears in.
+    A URL counts as an inter-duplicate in every later file, which is the same file-order precedence as running
+    :_filter_duplicate_urls_OvM file by file.
+
+    Args:
+        csv_files (list[str]): paths to the CSV files containing URLs, in the order they should take precedence
+        jobs (int): number of worker processes to read and format the CSV files with. The merge across files always
+                    runs in the current process, so the result does not depend on :jobs
+
+    Returns:
+        (bool): If True, the CSV files without duplicate URLs have been created successfully, False otherwise
+    """
+    col_file = 'file'
+    frames = []
+    for idc in _count_intra_duplicates(csv_files, jobs):
+        logging.info(f'FILTER: {idc.file_path}')
+        target_df = filter_intra_duplicate_urls(idc.df.copy(), idc.intra_duplicates)
+        frames.append(target_df.assign(**{col_file: idc.file_path}))
+
+    if not frames:
+        return True
+
+    all_df = pd.concat(frames, ignore_index=True)
+    is_duplicate = all_df.duplicated(subset=col_URL, keep='first')
+    first_seen = all_df.loc[~is_duplicate].set_index(col_URL)[[col_file, col_AID]]
+    logging.info(f'INDEX_BUILT: {len(first_seen)} unique profile URLs in {len(csv_files)} files')
+
+    # files without any rows are not among the groups but still get an (empty) `_filtered` file, as in the OvM mode
+    file_dfs = dict(tuple(all_df.groupby(col_file, sort=False)))
+    success = True
+    for file in csv_files:
+        file_df = file_dfs.get(file, all_df.iloc[:0])
+        is_file_duplicate = is_duplicate.loc[file_df.index]
+        owners = first_seen.loc[file_df.loc[is_file_duplicate, col_URL], col_file].value_counts(sort=False)
+        for owner, count in owners.items():
+            logging.info(f'DUPLICATES_OF: {count} profile URLs of {file} already listed in {owner}')
+        success &= _write_URL_files(file,
+                                    df_uniques=file_df.loc[~is_file_duplicate, [col_AID, col_URL]],
+                                    df_duplicates=file_df.loc[is_file_duplicate, [col_AID, col_URL]])
+    return success
+
+
+def _filter_duplicate_urls_incrementally(csv_files, jobs=1):
+    """
+    Filters out duplicate profile URLs of newly arriving CSV files against the persistent URL index
+    :PARAM.URL_INDEX_FILE instead of against all previously filtered CSV files. Source files that have been indexed
+    before are skipped, and the URLs accepted from each new file are added to the index right after its `_filtered`
+    file has been written. A file indexed before whose content has changed since, e.g. delivered again with new rows,
+    is filtered again as a whole: its URLs are removed from the index and its previous `_filtered` files are moved to
+    :PARAM.SAVE_DIR/prev.
+
+    Args:
+        csv_files (list[str]): paths to the CSV files containing URLs, in the order they should take precedence
+        jobs (int): number of worker processes to read and format the new or changed CSV files with. The lookups in
+                    the index always run in the current process, so the result does not depend on :jobs
+
+    Returns:
+        (bool): If True, the CSV files without duplicate URLs have been created successfully, False otherwise
+    """
+    index = URLIndex(PARAM.URL_INDEX_FILE)
+    to_filter = []
+    for file in csv_files:
+        file_name = parse_filename(file)
+        indexed_stats = index.get_file_stats(file_name)
+        if indexed_stats is None:
+            stats = get_file_stats(file)
+        else:
+            # the content is only hashed if the size or modification time differ from when the file was indexed
+            stats = get_file_stats(file, digest=False)
+            unchanged = stats[:2] == tuple(indexed_stats[:2])
+            if not unchanged:
+                stats = get_file_stats(file)
+                # files indexed before the content hashes were recorded are taken as unchanged
+                unchanged = indexed_stats[2] is None or stats[2] == indexed_stats[2]
+                if unchanged:
+                    index.set_file_stats(file_name, stats)
+            if unchanged:
+                logging.info(f'SKIP: {file} has already been indexed')
+                continue
+
+            logging.warning(f'CHANGED: {file} has changed since it was indexed and is filtered again as a whole')
+            index.remove_file(file_name)
+            backup_dir = join(PARAM.SAVE_DIR, 'prev')
+            make_dir(backup_dir)
+            for filtered_file in glob.glob(join(PARAM.SAVE_DIR, f'{file_name}_filtered_*.csv')):
+                shutil.move(filtered_file, backup_dir)
+        to_filter.append((file, stats))
+
+    success = True
+    idcs = _count_intra_duplicates([file for file, _ in to_filter], jobs)
+    for (file, stats), idc in zip(to_filter, idcs):
+        print()
+        logging.info(f'FILTER: {file}')
+        target_df = filter_intra_duplicate_urls(idc.df.copy(), idc.intra_duplicates)
+        is_duplicate = target_df[col_URL].isin(index.lookup(target_df[col_URL]))
+
+        df_uniques = target_df.loc[~is_duplicate, [col_AID, col_URL]]
+        if _write_URL_files(file, df_uniques, df_duplicates=target_df.loc[is_duplicate, [col_AID, col_URL]]):
+            index.add(df_uniques, idc.file_name, stats)
+        else:
+            success = False
+
+    logging.info(f'INDEX_SIZE: {len(index)} URLs in {PARAM.URL_INDEX_FILE}')
+    index.close()
+    return success
+
+
+def _append_to_csv(df, csv_file):
+    with open(csv_file, 'a+', newline='') as file:
+        df.to_csv(file, header=file.tell() == 0, index=False)
+
+
+def _read_csv_chunks(csv_file, usecols):
+    return pd.read_csv(csv_file, delimiter=',', header=0, usecols=usecols, dtype={col_AID: str},
+                       chunksize=PARAM.CHUNK_SIZE)
+
+
+def _filter_duplicate_urls_streaming(csv_files):
+    """
+    Filters out duplicate profile URLs of all CSV files with bounded memory. Every file is read in chunks of
+    :PARAM.CHUNK_SIZE rows, and only 64-bit fingerprints of the URLs seen so far are kept in memory, while the
+    `_filtered` and `_duplicates` CSV files are written chunk by chunk. Every file is read twice: first to find the
+    LAST occurrence of each of its URLs, which is the one kept of intra-duplicates as in the other modes, then to write
+    it. In between, a fingerprint and a flag per row of that file are kept.
+
+    URLs are matched by their fingerprints only, so a unique URL whose fingerprint collides with that of an already
+    accepted URL is wrongly written to `_duplicates`. For N distinct URLs in total, the expected number of such URLs is
+    at most N^2 / 2^65, i.e. about 3e-6 for 1e7 and 3e-4 for 1e8 URLs. Use the 'global' mode if that is not acceptable.
+
+    Args:
+        csv_files (list[str]): paths to the CSV files containing URLs, in the order they should take precedence
+
+    Returns:
+        (bool): If True, the CSV files without duplicate URLs have been created successfully, False otherwise
+    """
+    make_dir(PARAM.INTER_DUPLICATE_DIR)
+    accepted = FingerprintSet()
+    for file in csv_files:
+        logging.info(f'FILTER: {file}')
+        file_name = parse_filename(file)
+        new_file = join(PARAM.SAVE_DIR, f"{file_name}_filtered_{get_now()}.csv")
+        new_file_duplicates = join(PARAM.INTER_DUPLICATE_DIR, f'{file_name}_duplicates_{get_now()}.csv')
+        if exists(new_file):
+            return False
+
+        file_fingerprints = [fingerprint_urls(normalize_profile_urls(chunk[col_URL])[0])
+                             for chunk in _read_csv_chunks(file, usecols=[col_URL])]
+        file_fingerprints = np.concatenate(file_fingerprints) if file_fingerprints else np.empty(0, dtype=np.uint64)
+        is_last = ~pd.Series(file_fingerprints).duplicated(keep='last').to_numpy()
+
+        num_rows, num_invalid, num_uniques, num_duplicates = 0, 0, 0, 0
+        for chunk in _read_csv_chunks(file, usecols=[col_AID, col_URL]):
+            chunk[col_URL], invalid_counts = normalize_profile_urls(chunk[col_URL])
+            fingerprints = file_fingerprints[num_rows:num_rows + len(chunk)]
+            is_new = is_last[num_rows:num_rows + len(chunk)]
+
+            is_duplicate = is_new & accepted.contains(fingerprints)
+            is_unique = is_new & ~is_duplicate
+            accepted.add(fingerprints[is_unique])
+
+            _append_to_csv(chunk.loc[is_unique, [col_AID, col_URL]], new_file)
+            if is_duplicate.any():
+                _append_to_csv(chunk.loc[is_duplicate, [col_AID, col_URL]], new_file_duplicates)
+
+            num_rows += len(chunk)
+            num_invalid += int((invalid_counts > 0).sum())
+            num_uniques += int(is_unique.sum())
+            num_duplicates += int(is_duplicate.sum())
+
+        logging.info(f'DONE_FETCHING: {num_rows} entries fetched, {num_invalid} invalid URLs formatted')
+        logging.info(f"DONE_FILTERING: {num_uniques} unique profile URLs stored in {new_file}.")
+        if num_duplicates > 0:
+            logging.info(f"DUPLICATES_FOUND: {num_duplicates} inter-duplicate profile URLs stored in {new_file_duplicates}")
+        else:
+            logging.info(f"CLEAR: No inter-dupplicates found!")
+
+    logging.info(f'FINGERPRINTS: {len(accepted)} unique profile URLs kept in memory as 64-bit fingerprints')
+    return True
+
+
 def _backup_existing_CSV_files(from_, to_):
     csv_files = glob.glob(join(from_, '*.csv'))
     for csv in csv_files:
         shutil.move(csv, to_)
 
 
-def filter_duplicate_urls():
+def _list_source_CSV_files(profile_dir):
+    """
+    Lists the source CSV files in a folder in the order they take precedence in every filter mode, i.e. sorted by name,
+    so that the same URL is kept from the same file regardless of the mode
+
+    Args:
+        profile_dir (str): path to the folder containing the source CSV files
+
+    Returns:
+        (list[str]): paths to the source CSV files, without `_filtered` files
+    """
+    return sorted(file for file in glob.glob(join(profile_dir, '*.csv')) if 'filtered' not in file)
+
+
+def filter_duplicate_urls(jobs=1):
     """
     Filters out duplicate profile URLs contained in CSV files located in a folder to one another. CSV files that
     have `_filtered` suffix will be skipped for the comparison. Files that have been processed will
@@ -258,104 +480,98 @@ def filter_duplicate_urls():
     The goal is to have no duplicate URls among all csv files located in a target folder.
     Note that the folder :PARAM.SAVE_DIR should not contain any CSV files for the filter to work correctly. The filter
     will therefore move all CSV files to the subfolder :PARAM.SAVE_DIR/prev before proceeding
+
+    Args:
+        jobs (int): number of worker processes to read and format the CSV files with. It is honoured by the 'ovm',
+                    'global' and 'incremental' modes, while the 'stream' mode always reads its chunks in order in the
+                    current process
     """
 
     if not isdir(PARAM.PROFILE_DIR):
         logging.error(f'ERROR: {PARAM.PROFILE_DIR} is not a valid directory')
         exit()
 
+    csv_files = _list_source_CSV_files(PARAM.PROFILE_DIR)
+    if PARAM.FILTER_MODE == 'incremental':
+        if not _filter_duplicate_urls_incrementally(csv_files, jobs):
+            logging.warning(f'ERROR: An error occured while filtering duplicates from files in {PARAM.PROFILE_DIR}')
+        return
+
     backup_dir = join(PARAM.SAVE_DIR, 'prev')
     make_dir(backup_dir)
     _backup_existing_CSV_files(from_=PARAM.SAVE_DIR, to_=backup_dir)
 
-    csv_files = glob.glob(join(PARAM.PROFILE_DIR, '*.csv'))
-    for file in csv_files:
-        if 'filtered' in file:
-            continue
+    if PARAM.FILTER_MODE == 'stream' and jobs > 1:
+        logging.warning(f'IGNORED: --jobs {jobs} has no effect in the \'stream\' mode, which reads in one process')
+
+    if PARAM.FILTER_MODE in {'global', 'stream'}:
+        success = _filter_duplicate_urls_globally(csv_files, jobs) if PARAM.FILTER_MODE == 'global' \
+            else _filter_duplicate_urls_streaming(csv_files)
+        if not success:
+            logging.warning(f'ERROR: An error occured while filtering duplicates from files in {PARAM.PROFILE_DIR}')
+        return
+
+    for file, idc in zip(csv_files, _count_intra_duplicates(csv_files, jobs)):
         print()
         logging.info(f'FILTER: {file}')
-        success = _filter_duplicate_urls_OvM(file)
+        success = _filter_duplicate_urls_OvM(file, idc)
         if not success:
             logging.warning(f'ERROR: An error occured while filtering duplicates from file {file}')
 
 
 ########################################################################################################################
-def make_mappings_from_AID_URL_df(df, k=0, v=1):
+def _load_profile_urls(target_dir, jobs=1):
     """
-    Builds author_id <-> URL author_id mappings from a pandas.DataFrame with two respective columns
+    Loads the formatted (author_id, profile URL) pairs of all csv files inside a folder into one pandas.DataFrame
 
     Args:
-        df (pandas.DataFrame): The pandas.DataFrame containing only columns of 'author_id' and 'L---e---Link'
-        k (int): Takes only value 0 or 1. If k=0, the first column of :df will be the keys of the resulting mappings, otherwise, the second column is
-        v (int): Takes only value 0 or 1. If v=1, the second column of :df will be the values of the resulting mappings, otherwise, the first column is
+        target_dir (str): path to folder, in which all csv files containing profile URLs are located
+        jobs (int): number of worker processes to read and format the csv files with
 
     Returns:
-        (dict[str -> str]): the dict that maps author_id -> profile URLs or vice versa
-    """
-    tups = list(df.itertuples(index=False))
-    res = defaultdict(set)
-    for i in range(len(tups)):
-        res[tups[i][k]].add(tups[i][v])
-    return {_k: _v for _k, _v in res.items() if len(_v) > 1}
-
-
-def sort_csv(file_path, col_name):
-    """
-    Sorts a csv file by a specified column
-
-    Args:
-        file_path (str): path to the csv file
-        col_name (str): Name of the column, by which the csv should be sorted
+        (pandas.DataFrame): The distinct (author_id, profile URL) pairs of all csv files, author_id's as integers
     """
-    if isfile(file_path):
-        df = pd.read_csv(file_path, delimiter=',', header=0, dtype={col_AID: int})
-        df.sort_values(col_name, inplace=True)
-        df.to_csv(file_path, index=False, mode='w')
+    frames = [idc.df for idc in _count_intra_duplicates(sorted(glob.glob(join(target_dir, '*.csv'))), jobs)]
+    if not frames:
+        return pd.DataFrame(columns=[col_AID, col_URL])
+    df = pd.concat(frames, ignore_index=True).astype({col_AID: int})
+    return df.drop_duplicates(subset=[col_AID, col_URL], ignore_index=True)
 
 
-def _scan_invalid_mapping_between_AIDs_URLs(target_dir, sadu=True):
+def _scan_invalid_mapping_between_AIDs_URLs(target_dir, sadu=True, df=None):
     """
-    Scans invalid mappings between author_id's and profile URLs of all csv files inside a folder.
+    Scans invalid mappings between author_id's and profile URLs across all csv files inside a folder.
     Invalid cases could be the case that an author_id is mapped to multiple profile URLs or vice versa.
-    Such duplicates will be stored in a folder called 'tricky_duplicates' inside the folder ./urls/
+    Such duplicates will be stored, sorted, in a folder called 'tricky_duplicates' inside :target_dir
 
     Args:
         target_dir (str): path to folder, in which all csv files containing profile URLs are located
         sadu (bool): If true, run for the case "Same Author_id with Different URLs", else run for
                         "Same URLs with Different Author_id's" (SUDA)
+        df (pandas.DataFrame): The (author_id, profile URL) pairs of :target_dir if already loaded by
+                        :_load_profile_urls
     """
     case_adapter = {
         'file_name': 'same_authorid_diff_urls' if sadu else 'same_url_diff_authorids',
         'column_labels': [col_AID, col_URL] if sadu else [col_URL, col_AID],
-        'sort_col': col_AID if sadu else col_URL
     }
+    key, value = case_adapter['column_labels']
 
-    tricky_duplicates_dir = f'{target_dir}tricky_duplicates'
-    file_ = f'{tricky_duplicates_dir}/{case_adapter["file_name"]}_{get_now()}.csv'
-    for csv_file in glob.glob(f"{target_dir}*.csv"):
-        idc = IntraDuplicateCounter(csv_file)
-        col_idx_AID = idc.df.columns.get_loc(col_AID)
-        col_idx_URL = idc.df.columns.get_loc(col_URL)
-        # idc.df = remove_duplicate_urls(idc.df, idc.intra_duplicates)
-        duplicate_table = make_mappings_from_AID_URL_df(idc.df, k=col_idx_AID, v=col_idx_URL) \
-            if sadu else make_mappings_from_AID_URL_df(idc.df, k=col_idx_URL, v=col_idx_AID)
-
-        if not duplicate_table:
-            continue
+    if df is None:
+        df = _load_profile_urls(target_dir)
 
-        make_dir(tricky_duplicates_dir)
+    num_values = df.groupby(key)[value].nunique()
+    duplicates = df.loc[df[key].isin(num_values.index[num_values > 1]), case_adapter['column_labels']]
+    if duplicates.empty:
+        logging.info(f'CLEAR: No {case_adapter["file_name"]} found in {target_dir}')
+        return
 
-        rows = []
-        for k, v in duplicate_table.items():
-            for elem in v:
-                rows.append(pd.Series([k, elem], index=case_adapter['column_labels']))
-
-        duplicates = pd.DataFrame(rows, columns=case_adapter['column_labels'])
-
-        with open(file_, 'a+', newline='') as _file:
-            duplicates.to_csv(_file, header=(_file.tell() == 0), index=False)
-
-    sort_csv(file_, case_adapter['sort_col'])
+    tricky_duplicates_dir = join(target_dir, 'tricky_duplicates')
+    make_dir(tricky_duplicates_dir)
+    file_ = join(tricky_duplicates_dir, f'{case_adapter["file_name"]}_{get_now()}.csv')
+    duplicates.sort_values([key, value], kind='mergesort').to_csv(file_, index=False)
+    logging.info(f'DUPLICATES_FOUND: {num_values.gt(1).sum()} {key} values with multiple {value} values '
+                 f'stored in {file_}')
 
 
 def scan_same_authorID_with_different_urls(target_dir):
@@ -378,17 +594,40 @@ def scan_same_url_with_different_authorIDs(target_dir):
     _scan_invalid_mapping_between_AIDs_URLs(target_dir, sadu=False)
 
 
+def scan_invalid_mappings_between_AIDs_URLs(target_dir, jobs=1):
+    """
+    Scans for both cases of invalid mappings, while loading the csv files inside :target_dir only once.
+
+    Args:
+        target_dir (str): path to folder, in which all csv files containing profile URLs are located
+        jobs (int): number of worker processes to read and format the csv files with
+    """
+    df = _load_profile_urls(target_dir, jobs)
+    _scan_invalid_mapping_between_AIDs_URLs(target_dir, sadu=True, df=df)
+    _scan_invalid_mapping_between_AIDs_URLs(target_dir, sadu=False, df=df)
+
+
 def run():
     """
         Main function executing the module
     """
+    parser = argparse.ArgumentParser(description='Filter duplicate profile URLs or scan for invalid mappings '
+                                                 'between author_id\'s and profile URLs')
+    parser.add_argument('--jobs', type=int, default=PARAM.JOBS,
+                        help='number of worker processes to read and format the URL CSV files with '
+                             '(not used by the \'stream\' filter mode)')
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
 
     if PARAM.RUN_OPTION == 'filter':
-        filter_duplicate_urls()
+        filter_duplicate_urls(jobs=args.jobs)
+    elif PARAM.RUN_OPTION == 'rebuild_index':
+        rebuild_url_index()
+    elif PARAM.RUN_OPTION == 'verify_index':
+        verify_url_index()
     else:
-        scan_same_authorID_with_different_urls(target_dir=PARAM.SCAN_DIR)
-        scan_same_url_with_different_authorIDs(target_dir=PARAM.SCAN_DIR)
+        scan_invalid_mappings_between_AIDs_URLs(target_dir=PARAM.SCAN_DIR, jobs=args.jobs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,109 @@
+"""
+CLASSIFY SAVED PROFILE PAGES AS FAULTY OR NOT WITHOUT BUILDING A FULL HTML TREE
+"""
+
+import random
+import re
+from bs4 import BeautifulSoup
+
+from scraping.profile_source import read_pages
+
+PAGE_NOT_LOADED = 'page not loaded'
+INCOMPLETE = 'incomplete'
+NOT_LOGGED_IN = 'not logged in'
+
+
+def _tag_with_attr(tag, attr, value, is_token):
+    """
+    Compiles a regex over raw bytes matching the start tag of an element that has an attribute with a given value,
+    e.g. <main id="x" class="a core-rail b">
+
+    Args:
+        tag (bytes): name of the element, matched case-insensitively like html.parser does
+        attr (bytes): name of the attribute, matched case-insensitively like html.parser does
+        value (bytes): regex of the attribute value
+        is_token (bool): If True, :value only needs to be one of the whitespace separated tokens of the attribute
+                         value (the way BeautifulSoup matches 'class'), otherwise it must be the whole value
+
+    Returns:
+        (re.Pattern): the compiled regex
+    """
+    before, after = (rb'(?:[^"\'>]*\s)?', rb'(?:\s[^"\'>]*)?') if is_token else (b'', b'')
+    quoted = rb'(["\'])' + before + rb'(?:' + value + rb')' + after + rb'\1'
+    unquoted = rb'(?:' + value + rb')(?=[\s/>])'
+    # quoted values of the attributes before :attr may contain '>'
+    other_attrs = rb'(?:[^>"\']|"[^"]*"|\'[^\']*\')*?'
+    return re.compile(rb'<(?i:' + tag + rb')(?=[\s/>])' + other_attrs + rb'\s(?i:' + attr + rb')\s*=\s*(?:' + quoted +
+                      b'|' + unquoted + rb')')
+
+
+_CORE_RAIL = _tag_with_attr(b'main', b'class', rb'core-rail', is_token=True)
+_LOADER = _tag_with_attr(b'span', b'class', rb'artdeco-loader__bars|artdeco-spinner--bars', is_token=True)
+_NAV_HEADER = _tag_with_attr(b'header', b'id', rb'extended-nav', is_token=False)
+
+
+def classify_page(page):
+    """
+    Classifies a saved profile page by scanning its raw bytes. Each check stops at the first match, and later checks
+    are skipped as soon as the verdict is known. Unlike BeautifulSoup, tags inside HTML comments or scripts are not told
+    apart, and character references in attribute values (e.g. class="core&#45;rail") are not decoded. This is why the
+    validator runs :compare_classifiers on a sample of the pages by default, see VERIFY_CLASSIFIER_SAMPLE_SIZE.
+
+    Args:
+        page (bytes): content of the HTML file
+
+    Returns:
+        (str): 'page not loaded' if there is no main.core-rail, 'incomplete' if a loader/spinner is still shown,
+        'not logged in' if there is no header#extended-nav, or None if the page is fine
+    """
+    if not _CORE_RAIL.search(page):
+        return PAGE_NOT_LOADED
+    if _LOADER.search(page):
+        return INCOMPLETE
+    if not _NAV_HEADER.search(page):
+        return NOT_LOGGED_IN
+    return None
+
+
+def classify_page_bsoup(page):
+    """
+    Classifies a saved profile page by building a BeautifulSoup tree of it. Same verdicts as :classify_page.
+
+    Args:
+        page (bytes): content of the HTML file
+
+    Returns:
+        (str): the cause why the page is faulty, or None if the page is fine
+    """
+    bsoup = BeautifulSoup(page.decode('UTF-8'), "html.parser")
+    if not bsoup.find('main', {'class': 'core-rail'}):
+        return PAGE_NOT_LOADED
+    if bsoup.find('span', {'class': 'artdeco-loader__bars'}) or bsoup.find('span', {'class': 'artdeco-spinner--bars'}):
+        return INCOMPLETE
+    if not bsoup.find('header', {'id': 'extended-nav'}):
+        return NOT_LOGGED_IN
+    return None
+
+
+def compare_classifiers(html_files, sample_size=None, seed=0, archive=None):
+    """
+    Validates :classify_page against :classify_page_bsoup on a (random sample of a) corpus of saved profile pages
+
+    Args:
+        html_files (list[str]): paths to the HTML files
+        sample_size (int): number of files to sample, or None to compare on all :html_files
+        seed (int): seed for drawing the sample
+        archive (str): path to the archive the pages are stored in, or None for loose HTML files
+
+    Returns:
+        (dict[str -> tuple(str, str)]): path of each file the classifiers disagree on -> (regex verdict, bsoup verdict)
+    """
+    if sample_size is not None and sample_size < len(html_files):
+        html_files = random.Random(seed).sample(html_files, sample_size)
+
+    mismatches = {}
+    for html_file, page in read_pages(html_files, archive=archive):
+        verdicts = classify_page(page), classify_page_bsoup(page)
+        if verdicts[0] != verdicts[1]:
+            mismatches[html_file] = verdicts
+    return mismatches
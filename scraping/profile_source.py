@@ -0,0 +1,190 @@
+"""
+READ SAVED PROFILE PAGES FROM A ZIP OR TAR(.GZ/.BZ2/.XZ/.ZST) ARCHIVE INSTEAD OF A FOLDER OF LOOSE HTML FILES
+"""
+
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from os.path import isfile, join
+
+try:
+    import zstandard
+except ImportError:  # only needed for .tar.zst archives
+    zstandard = None
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar.zst')
+
+
+def is_archive(path):
+    """
+    Args:
+        path (str): path to a folder of profile pages or to an archive of them
+
+    Returns:
+        (bool): True if :path is an archive file that can be read by this module
+    """
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and isfile(path)
+
+
+def _iter_members(archive, stack):
+    """
+    Iterates over the HTML members of an archive in the order they are stored. TAR archives are read as a stream, so
+    that compressed ones are decompressed only once from start to end.
+
+    Args:
+        archive (str): path to the archive
+        stack (contextlib.ExitStack): the stack the opened files are registered to
+
+    Yields:
+        (tuple(str, int, int, function)): (path of the page, i.e. the member name joined to :archive, size, modification
+        time in ns, function returning the content of the member) per HTML member. The function must be called before
+        the next member is yielded.
+    """
+    if archive.lower().endswith('.zip'):
+        zip_file = stack.enter_context(zipfile.ZipFile(archive))
+        for info in zip_file.infolist():
+            if not info.is_dir() and info.filename.endswith('.html'):
+                mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 10 ** 9
+                yield join(archive, info.filename), info.file_size, mtime_ns, lambda info=info: zip_file.read(info)
+        return
+
+    if archive.lower().endswith('.tar.zst'):
+        if zstandard is None:
+            raise ImportError(f'The package zstandard is required to read {archive}')
+        file = stack.enter_context(open(archive, 'rb'))
+        stream = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(file))
+        tar_file = stack.enter_context(tarfile.open(fileobj=stream, mode='r|'))
+    else:
+        tar_file = stack.enter_context(tarfile.open(archive, mode='r|*'))
+    for member in tar_file:
+        if member.isfile() and member.name.endswith('.html'):
+            # the mtime of a PAX member is a float with sub-second precision
+            yield (join(archive, member.name), member.size, int(member.mtime * 10 ** 9),
+                   lambda member=member: tar_file.extractfile(member).read())
+
+
+def list_archive_pages(archive):
+    """
+    Lists the profile pages stored in an archive
+
+    Args:
+        archive (str): path to the archive
+
+    Returns:
+        (dict[str -> tuple(int, int)]): path of each page, i.e. the member name joined to :archive, so that
+        get_file_name gives the profile name as for loose files -> (size, modification time in ns)
+    """
+    with ExitStack() as stack:
+        return {page: (size, mtime_ns) for page, size, mtime_ns, _ in _iter_members(archive, stack)}
+
+
+def read_pages(pages, archive=None, prefetch=0):
+    """
+    Reads profile pages from their HTML files in the order of :pages or, if :archive is given, from the archive in the
+    order they are stored in it. With :prefetch > 0, the pages are read (and decompressed) by a background thread while
+    the pages read so far are processed.
+
+    Args:
+        pages (iterable[str]): paths of the pages to read, as listed by :list_archive_pages for an archive. Pages not
+                               found are skipped. An archive is only read up to the last of the pages stored in it
+        archive (str): path to the archive the pages are stored in, or None for loose HTML files
+        prefetch (int): number of pages the background thread may read ahead, or 0 to read without a thread
+
+    Yields:
+        (tuple(str, bytes)): (path of the page, content) per page found
+    """
+    def read():
+        if archive is None:
+            for page in pages:
+                if isfile(page):
+                    with open(page, 'rb') as file:
+                        yield page, file.read()
+            return
+        wanted = set(pages)
+        if not wanted:
+            return
+        with ExitStack() as stack:
+            for page, _, _, read_content in _iter_members(archive, stack):
+                if page in wanted:
+                    yield page, read_content()
+                    wanted.discard(page)
+                    if not wanted:  # the rest of the archive is not decompressed
+                        return
+
+    if prefetch <= 0:
+        yield from read()
+        return
+
+    buffer = queue.Queue(maxsize=prefetch)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # gives up once the consumer has stopped, so that the thread never blocks on a full buffer
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fill():
+        try:
+            for item in read():
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    reader = threading.Thread(target=fill, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def map_chunks_in_order(func, items, jobs=1, chunk_size=100):
+    """
+    Applies a function to consecutive chunks of items, in a pool of :jobs worker processes if :jobs > 1. The items are
+    consumed lazily and at most 2 * :jobs chunks are dispatched at a time, so that pages streamed from an archive are
+    not all held in memory at once.
+
+    Args:
+        func (function): picklable function taking a list of items and returning a list of results
+        items (iterable): the items, e.g. pages with their content
+        jobs (int): number of worker processes
+        chunk_size (int): number of items dispatched to a worker at once
+
+    Yields:
+        (list): the results of :func per chunk, in the order of :items regardless of :jobs
+    """
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    if jobs <= 1:
+        yield from map(func, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,254 @@
+"""
+BENCHMARK THE DUPLICATE URL FILTER ON A SYNTHETIC CORPUS OF URL CSV FILES
+"""
+
+import json
+import logging
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from scraping.utils import *
+import scraping.duplicate_url_filter as url_filter
+from config import URL_FILTER_BENCHMARK_PARAMS as PARAM
+
+MALFORMED_SUFFIXES = np.array(['?trk=public_profile', '/de', '/', '/en/?originalSubdomain=de'])
+
+
+def generate_url_corpus(target_dir, num_files, rows_per_file, intra_duplicate_rate, inter_duplicate_rate,
+                        malformed_rate, seed=0):
+    """
+    Generates synthetic CSV files with columns 'author_id' and 'L---e---Link' like the ones read by
+    scraping.duplicate_url_filter
+
+    Args:
+        target_dir (str): path to the folder the CSV files are written to
+        num_files (int): number of CSV files
+        rows_per_file (int): number of rows per CSV file
+        intra_duplicate_rate (float): share of rows repeating a profile of the same file
+        inter_duplicate_rate (float): share of rows repeating a profile of an earlier file
+        malformed_rate (float): share of URLs having a query string, a locale suffix or a tailing backslash
+        seed (int): seed of the random generator, so that the same parameters always give the same corpus
+
+    Returns:
+        (list[str]): paths to the generated CSV files
+    """
+    rng = np.random.default_rng(seed)
+    make_dir(target_dir)
+    csv_files = []
+    prev_names = []
+    for k in range(num_files):
+        num_inter = int(rows_per_file * inter_duplicate_rate) if prev_names else 0
+        num_intra = int(rows_per_file * intra_duplicate_rate)
+        num_fresh = rows_per_file - num_inter - num_intra
+
+        fresh = np.array([f'bench-{k}-{i}' for i in range(num_fresh)], dtype=object)
+        names = np.concatenate([fresh,
+                                rng.choice(fresh, num_intra),
+                                rng.choice(np.concatenate(prev_names), num_inter) if num_inter else fresh[:0]])
+        rng.shuffle(names)
+        prev_names.append(fresh)
+
+        urls = 'https://www.l---e---.com/in/' + names
+        is_malformed = rng.random(rows_per_file) < malformed_rate
+        urls[is_malformed] += rng.choice(MALFORMED_SUFFIXES, int(is_malformed.sum()))
+
+        csv_file = join(target_dir, f'bench_urls_{k:03d}.csv')
+        pd.DataFrame({col_AID: rng.integers(1, 10 * rows_per_file * num_files, rows_per_file),
+                      col_URL: urls}).to_csv(csv_file, index=False)
+        csv_files.append(csv_file)
+
+    logging.info(f'CORPUS_GENERATED: {num_files} files x {rows_per_file} rows in {target_dir}')
+    return csv_files
+
+
+def generate_intra_duplicate_frame(num_rows, intra_duplicate_rate, seed=0):
+    """
+    Generates a single synthetic pandas.DataFrame of canonical profile URLs, in which a share of the rows repeat a
+    profile of another row
+
+    Args:
+        num_rows (int): number of rows
+        intra_duplicate_rate (float): share of rows repeating a profile of another row
+        seed (int): seed of the random generator, so that the same parameters always give the same frame
+
+    Returns:
+        (pandas.DataFrame): The pandas.DataFrame with columns 'author_id' and 'L---e---Link'
+    """
+    rng = np.random.default_rng(seed)
+    num_fresh = num_rows - int(num_rows * intra_duplicate_rate)
+    fresh = np.array([f'bench-{i}' for i in range(num_fresh)], dtype=object)
+    names = np.concatenate([fresh, rng.choice(fresh, num_rows - num_fresh)])
+    rng.shuffle(names)
+    return pd.DataFrame({col_AID: rng.integers(1, 10 * num_rows, num_rows),
+                         col_URL: 'https://www.l---e---.com/in/' + names})
+
+
+def _count_intra_duplicate_urls_old(df):
+    """
+    The previous implementation of duplicate_url_filter.count_intra_duplicate_urls, comparing neighbouring rows of the
+    sorted pandas.DataFrame one by one. It is only kept as the baseline of the benchmark.
+    """
+    duplicates = {}
+    _df = df.sort_values(col_URL)
+    for i in range(len(_df)):
+        if i == 0:
+            continue
+        cur_row = _df.iloc[i]
+        prev_row = _df.iloc[i - 1]
+        if cur_row[col_URL] == prev_row[col_URL]:
+            key = cur_row[col_URL]
+            duplicates[key] = 1 if duplicates.get(key) is None else (duplicates.get(key) + 1)
+    return duplicates
+
+
+def _filter_intra_duplicate_urls_old(df, intra_duplicate_URLs):
+    """
+    The previous implementation of duplicate_url_filter.filter_intra_duplicate_urls, dropping one row at a time. It is
+    only kept as the baseline of the benchmark.
+    """
+    _intra_duplicates = intra_duplicate_URLs.copy()
+    for i, row in df.iterrows():
+        url = row[col_URL]
+        if _intra_duplicates.get(url) and _intra_duplicates.get(url) > 0:
+            df.drop(i, inplace=True)
+            _intra_duplicates[url] -= 1
+    return df
+
+
+INTRA_DUPLICATE_IMPLEMENTATIONS = {
+    'old': (_count_intra_duplicate_urls_old, _filter_intra_duplicate_urls_old),
+    'new': (url_filter.count_intra_duplicate_urls, url_filter.filter_intra_duplicate_urls),
+}
+
+
+def _get_peak_rss_mb():
+    """
+    Returns:
+        (float): peak resident set size in MB of the current process and its terminated child processes, or None if
+        it cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _run_case(case, corpus_dir, work_dir):
+    """
+    Runs a single benchmark case. It is meant to run in a fresh process, so that the peak memory only covers this case.
+
+    Args:
+        case (dict): the case to run, with keys 'task' ('filter', 'scan' or 'intra_duplicates'), 'filter_mode' and
+                     'jobs', and for 'intra_duplicates' also 'rows' and 'implementation' ('old' or 'new')
+        corpus_dir (str): path to the folder containing the synthetic CSV files
+        work_dir (str): path to an empty folder for the outputs of this case
+
+    Returns:
+        (dict): :case together with the measured 'wall_time_s' and 'peak_rss_mb', or an 'error'. 'intra_duplicates'
+        cases also report the number of 'rows_kept' and a 'checksum' of the kept rows to compare implementations by
+    """
+    logging.disable(logging.INFO)
+    url_filter.PARAM.PROFILE_DIR = corpus_dir
+    url_filter.PARAM.SAVE_DIR = join(work_dir, 'filtered')
+    url_filter.PARAM.INTER_DUPLICATE_DIR = join(work_dir, 'inter_duplicates')
+    url_filter.PARAM.URL_INDEX_FILE = join(work_dir, 'url_index.sqlite')
+    url_filter.PARAM.FILTER_MODE = case['filter_mode']
+    make_dir(url_filter.PARAM.SAVE_DIR)
+
+    result = dict(case)
+    if case['task'] == 'intra_duplicates':  # generated before the timer starts
+        df = generate_intra_duplicate_frame(case['rows'], PARAM.INTRA_DUPLICATE_RATE, PARAM.SEED)
+    start = time.perf_counter()
+    try:
+        if case['task'] == 'filter':
+            url_filter.filter_duplicate_urls(jobs=case['jobs'])
+        elif case['task'] == 'intra_duplicates':
+            count, filter_ = INTRA_DUPLICATE_IMPLEMENTATIONS[case['implementation']]
+            df_kept = filter_(df, count(df))
+            result['rows_kept'] = len(df_kept)
+            result['checksum'] = int(pd.util.hash_pandas_object(df_kept).to_numpy().sum())
+        else:
+            url_filter.scan_invalid_mappings_between_AIDs_URLs(corpus_dir, jobs=case['jobs'])
+    except Exception as e:
+        result['error'] = repr(e)
+    result['wall_time_s'] = round(time.perf_counter() - start, 3)
+    result['peak_rss_mb'] = _get_peak_rss_mb()
+    return result
+
+
+def _get_cases():
+    cases = []
+    for filter_mode in PARAM.FILTER_MODES:
+        for jobs in ([1] if filter_mode == 'stream' else PARAM.JOBS):
+            cases.append({'task': 'filter', 'filter_mode': filter_mode, 'jobs': jobs})
+    for jobs in PARAM.JOBS:
+        cases.append({'task': 'scan', 'filter_mode': None, 'jobs': jobs})
+    for rows in PARAM.INTRA_DUPLICATE_ROWS:
+        for implementation in INTRA_DUPLICATE_IMPLEMENTATIONS:
+            if implementation == 'old' and rows > PARAM.INTRA_DUPLICATE_OLD_MAX_ROWS:
+                continue
+            cases.append({'task': 'intra_duplicates', 'filter_mode': None, 'jobs': 1, 'rows': rows,
+                          'implementation': implementation})
+    return cases
+
+
+def run_benchmark():
+    """
+    Generates a synthetic URL corpus by :PARAM and times filter_duplicate_urls in every mode of :PARAM.FILTER_MODES as
+    well as the AID/URL conflict scan on it. Counting and filtering intra-duplicates is timed separately on single
+    frames of :PARAM.INTRA_DUPLICATE_ROWS rows, with both the previous and the current implementation. The results are
+    stored as JSON file in :PARAM.RESULTS_DIR
+    """
+    corpus_params = {
+        'num_files': PARAM.NUM_FILES,
+        'rows_per_file': PARAM.ROWS_PER_FILE,
+        'intra_duplicate_rate': PARAM.INTRA_DUPLICATE_RATE,
+        'inter_duplicate_rate': PARAM.INTER_DUPLICATE_RATE,
+        'malformed_rate': PARAM.MALFORMED_RATE,
+        'seed': PARAM.SEED,
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = join(tmp_dir, 'corpus')
+        generate_url_corpus(corpus_dir, **corpus_params)
+
+        for i, case in enumerate(_get_cases()):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(_run_case, case, corpus_dir, join(tmp_dir, f'case_{i}')).result()
+            logging.info(f'BENCHMARK: {result}')
+            results.append(result)
+
+    checksums = defaultdict(set)
+    for result in results:
+        if result['task'] == 'intra_duplicates' and 'checksum' in result:
+            checksums[result['rows']].add(result['checksum'])
+    for rows, rows_checksums in checksums.items():
+        if len(rows_checksums) > 1:
+            logging.warning(f'MISMATCH: the implementations keep different rows of the {rows}-row intra-duplicate frame')
+
+    make_dir(PARAM.RESULTS_DIR)
+    file_ = join(PARAM.RESULTS_DIR, f'url_filter_benchmark_{get_now()}.json')
+    with open(file_, 'w') as file:
+        json.dump({'corpus': corpus_params, 'results': results}, file, indent=2)
+    logging.info(f'SAVED: Benchmark results stored in {file_}')
+
+
+def run():
+    """
+        Main function executing the module
+    """
+    logging.basicConfig(level=logging.INFO)
+    run_benchmark()
+
+
+if __name__ == '__main__':
+    run()
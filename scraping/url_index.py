@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from os.path import isfile, join
+
+from scraping.utils import *
+from config import URL_FILTER_PARAMS as PARAM
+
+
+class URLIndex:
+    """
+    A persistent on-disk index (SQLite) of every canonical profile URL that has already been accepted into a `_filtered`
+    CSV file, together with the author_id and the name of the source CSV file it was accepted from. It allows a newly
+    arriving CSV file to be deduplicated against the whole history in time proportional to its own size. The size,
+    modification time and content hash of every source CSV file are kept as well, so that a file delivered again under
+    the same name with other content is told apart from one that has been indexed already.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, {col_AID} TEXT, file_name TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS files (file_name TEXT PRIMARY KEY, indexed_at TEXT, size INTEGER, '
+                          'mtime_ns INTEGER, digest TEXT)')
+        # indexes created before the files were told apart by their content only have the first two columns
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(files)')}
+        for column, type_ in (('size', 'INTEGER'), ('mtime_ns', 'INTEGER'), ('digest', 'TEXT')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE files ADD COLUMN {column} {type_}')
+        self.conn.execute('CREATE TEMP TABLE candidates (url TEXT PRIMARY KEY)')
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+    def has_file(self, file_name):
+        """
+        Checks whether the URLs of a source CSV file have already been added to the index
+
+        Args:
+            file_name (str): Name of the source CSV file without extension
+
+        Returns:
+            (bool): True if the file has been indexed before
+        """
+        return self.get_file_stats(file_name) is not None
+
+    def get_file_stats(self, file_name):
+        """
+        Args:
+            file_name (str): Name of the source CSV file without extension
+
+        Returns:
+            (tuple(int, int, str)): size, modification time in ns and content hash (see :get_file_stats) of the source
+            CSV file when it was indexed, each None if not recorded, or None if the file has not been indexed
+        """
+        return self.conn.execute('SELECT size, mtime_ns, digest FROM files WHERE file_name = ?',
+                                 (file_name,)).fetchone()
+
+    def set_file_stats(self, file_name, stats):
+        """
+        Records the stats of an indexed source CSV file, e.g. after it has been touched without changing its content
+
+        Args:
+            file_name (str): Name of the source CSV file without extension
+            stats (tuple(int, int, str)): size, modification time in ns and content hash by :get_file_stats
+        """
+        with self.conn:
+            self.conn.execute('UPDATE files SET size = ?, mtime_ns = ?, digest = ? WHERE file_name = ?',
+                              (*stats, file_name))
+
+    def remove_file(self, file_name):
+        """
+        Removes a source CSV file and the URLs accepted from it from the index, e.g. before filtering it again
+
+        Args:
+            file_name (str): Name of the source CSV file without extension
+        """
+        with self.conn:
+            num_urls = self.conn.execute('DELETE FROM urls WHERE file_name = ?', (file_name,)).rowcount
+            self.conn.execute('DELETE FROM files WHERE file_name = ?', (file_name,))
+        logging.info(f'UNINDEXED: {num_urls} URLs of {file_name} removed from {self.db_file}')
+
+    def lookup(self, urls):
+        """
+        Looks up which of the given profile URLs are already in the index
+
+        Args:
+            urls (pandas.Series): The canonical profile URLs to look up
+
+        Returns:
+            (set[str]): The subset of :urls that is already indexed
+        """
+        self.conn.execute('DELETE FROM candidates')
+        self.conn.executemany('INSERT OR IGNORE INTO candidates VALUES (?)', ((url,) for url in urls.dropna()))
+        rows = self.conn.execute('SELECT c.url FROM candidates c JOIN urls u ON u.url = c.url').fetchall()
+        return {url for url, in rows}
+
+    def add(self, df, file_name, stats=(None, None, None)):
+        """
+        Adds the URLs accepted from a source CSV file to the index. URLs that are already indexed keep their first entry.
+
+        Args:
+            df (pandas.DataFrame): The pandas.DataFrame with columns 'author_id' and 'L---e---Link' of accepted URLs
+            file_name (str): Name of the source CSV file without extension
+            stats (tuple(int, int, str)): size, modification time in ns and content hash of the source CSV file by
+                                          :get_file_stats, or Nones if unknown, e.g. when rebuilding the index
+        """
+        with self.conn:
+            self.conn.executemany(f'INSERT OR IGNORE INTO urls (url, {col_AID}, file_name) VALUES (?, ?, ?)',
+                                  ((url, aid, file_name) for aid, url in
+                                   df[[col_AID, col_URL]].dropna(subset=[col_URL]).itertuples(index=False, name=None)))
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', (file_name, get_now(), *stats))
+        logging.info(f'INDEXED: {len(df)} URLs of {file_name} added to {self.db_file}')
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute('DELETE FROM urls')
+            self.conn.execute('DELETE FROM files')
+
+    def author_ids(self):
+        """
+        Returns:
+            (dict[str, str]): The author_id of every indexed URL
+        """
+        return {url: aid for url, aid in self.conn.execute(f'SELECT url, {col_AID} FROM urls')}
+
+
+def get_file_stats(csv_file, digest=True):
+    """
+    Args:
+        csv_file (str): path to a source CSV file
+        digest (bool): If False, the content hash is not computed
+
+    Returns:
+        (tuple(int, int, str)): size, modification time in ns and SHA-1 hash of the content (or None) of :csv_file
+    """
+    stat = os.stat(csv_file)
+    if not digest:
+        return stat.st_size, stat.st_mtime_ns, None
+    sha1 = hashlib.sha1()
+    with open(csv_file, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(block)
+    return stat.st_size, stat.st_mtime_ns, sha1.hexdigest()
+
+
+def fingerprint_urls(urls):
+    """
+    Hashes profile URLs to 64-bit fingerprints
+
+    Args:
+        urls (pandas.Series): The canonical profile URLs to be hashed
+
+    Returns:
+        (numpy.ndarray): The uint64 fingerprints, one per URL
+    """
+    return pd.util.hash_pandas_object(urls, index=False).to_numpy()
+
+
+class FingerprintSet:
+    """
+    A compact in-memory membership structure for 64-bit URL fingerprints, which costs 8 bytes per URL instead of a
+    Python string per URL. Fingerprints are kept in sorted NumPy arrays (runs) that are merged whenever a run is not
+    more than twice as large as the next one, so there are only O(log n) runs to search.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def contains(self, fingerprints):
+        """
+        Args:
+            fingerprints (numpy.ndarray): uint64 fingerprints to look up
+
+        Returns:
+            (numpy.ndarray): boolean mask telling which of :fingerprints are in the set
+        """
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, fingerprints).clip(max=len(run) - 1)
+            found |= run[pos] == fingerprints
+        return found
+
+    def add(self, fingerprints):
+        """
+        Args:
+            fingerprints (numpy.ndarray): uint64 fingerprints to add. They must not be in the set already.
+        """
+        if len(fingerprints) == 0:
+            return
+        self._runs.append(np.unique(fingerprints))
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]))
+
+
+def _read_filtered_files(filtered_dir):
+    """
+    Reads all `_filtered` CSV files in a folder
+
+    Args:
+        filtered_dir (str): path to the folder containing the `_filtered` CSV files
+
+    Returns:
+        (list[tuple(str, pandas.DataFrame)]): name of the source CSV file and the URLs accepted from it, for each file
+    """
+    filtered = []
+    for csv_file in sorted(glob.glob(join(filtered_dir, '*_filtered*.csv'))):
+        df = pd.read_csv(csv_file, delimiter=',', header=0, usecols=[col_AID, col_URL], dtype={col_AID: str})
+        filtered.append((parse_filename(csv_file).partition('_filtered')[0], df))
+    return filtered
+
+
+def rebuild_url_index():
+    """
+    Rebuilds the URL index :PARAM.URL_INDEX_FILE from scratch out of the `_filtered` CSV files in :PARAM.SAVE_DIR
+    """
+    index = URLIndex(PARAM.URL_INDEX_FILE)
+    index.clear()
+    for file_name, df in _read_filtered_files(PARAM.SAVE_DIR):
+        index.add(df, file_name)
+    logging.info(f'DONE_REBUILDING: {len(index)} URLs indexed in {PARAM.URL_INDEX_FILE}')
+    index.close()
+
+
+def verify_url_index():
+    """
+    Verifies that the URL index :PARAM.URL_INDEX_FILE holds exactly the URLs of the `_filtered` CSV files in
+    :PARAM.SAVE_DIR, each with the same author_id. URLs are compared exactly, not by their fingerprints. Note that
+    this does not detect a unique URL dropped as duplicate by a fingerprint collision in the 'stream' mode, since such
+    a URL is in neither of the two; see :_filter_duplicate_urls_streaming for how unlikely that is.
+
+    Returns:
+        (bool): True if the index and the `_filtered` CSV files agree, False otherwise
+    """
+    if not isfile(PARAM.URL_INDEX_FILE):
+        logging.error(f'ERROR: URL index {PARAM.URL_INDEX_FILE} not found')
+        return False
+
+    index = URLIndex(PARAM.URL_INDEX_FILE)
+    indexed_aids = index.author_ids()
+    index.close()
+
+    filtered_aids = {}
+    for _, df in _read_filtered_files(PARAM.SAVE_DIR):
+        df = df.dropna(subset=[col_URL])
+        filtered_aids.update(zip(df[col_URL], df[col_AID].where(df[col_AID].notna(), None)))
+
+    indexed_urls, filtered_urls = indexed_aids.keys(), filtered_aids.keys()
+    not_indexed = filtered_urls - indexed_urls
+    not_filtered = indexed_urls - filtered_urls
+    other_aid = [url for url in filtered_urls & indexed_urls if filtered_aids[url] != indexed_aids[url]]
+    if not_indexed or not_filtered or other_aid:
+        logging.warning(f'INDEX_DRIFT: {len(not_indexed)} filtered URLs are missing in the index, '
+                        f'{len(not_filtered)} indexed URLs are missing in {PARAM.SAVE_DIR}, '
+                        f'{len(other_aid)} URLs have another author_id in the index. Please rebuild the index')
+        return False
+
+    logging.info(f'INDEX_VERIFIED: {len(indexed_urls)} URLs in {PARAM.URL_INDEX_FILE} match the filtered CSV files')
+    return True
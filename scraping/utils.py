@@ -7,6 +7,7 @@ from datetime import datetime
 import pytz
 import pandas as pd
 import numpy as np
+from pandas.core.strings.accessor import StringMethods as _StringMethods
 
 col_URL = 'L---e---Link'
 col_AID = 'author_id'
@@ -75,6 +76,46 @@ def parse_profile_name(url):
     return profile_name
 
 
+def _str(column):
+    """
+    Returns the string methods of a column without caching them on it, unlike `column.str`. The cached accessor and
+    the column refer to each other, so the column's data outlives it until the next full garbage collection, which
+    piles up the chunks of :_filter_duplicate_urls_streaming.
+    """
+    return _StringMethods(column)
+
+
+def normalize_profile_urls(urls):
+    """
+    Canonicalizes a whole column of profile URLs in one pass. This is the column-wise counterpart of
+    :parse_profile_name, :strip_query and :strip_locale, i.e. a tailing backslash, query strings and locale suffixes
+    are stripped and the URL is rebuilt as 'https://www.l---e---.com/in/<profile_name>'. URLs without a profile name
+    are left untouched.
+
+    Args:
+        urls (pandas.Series): The profile URLs to be normalized
+
+    Returns:
+        (tuple(pandas.Series, pandas.Series)): The normalized URLs and, per row, how many times the original URL is
+        counted as invalid (once for a query string, once more if no profile name is left)
+    """
+    if urls.empty:  # str.partition() of an empty column has no columns to take the profile names from
+        return urls.copy(), pd.Series(0, index=urls.index, dtype=int)
+
+    stripped = urls.where(~_str(urls).endswith('/', na=False), _str(urls)[:-1])
+    profile_names = _str(stripped).partition('/in/')[2]
+
+    has_query = _str(profile_names).contains('?', regex=False, na=False)
+    profile_names = _str(profile_names).partition('?')[0]
+
+    has_locale = _str(profile_names).contains('/', regex=False, na=False)
+    profile_names = _str(profile_names).partition('/')[0]
+
+    is_empty = ~has_locale & (profile_names == '')
+    normalized = urls.where(profile_names.fillna('') == '', 'https://www.l---e---.com/in/' + profile_names)
+    return normalized, has_query.astype(int) + is_empty.astype(int)
+
+
 def strip_ending_backslash(url):
     if url[len(url) - 1] == "/":
         url = url[:len(url) - 1]
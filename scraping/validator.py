@@ -1,10 +1,14 @@
+import hashlib
 import logging
 import sys
-from bs4 import BeautifulSoup
+import time
+from functools import partial
 from os.path import isfile, isdir, join
 
 from analysis.utils import *
 from scraping.utils import *
+from scraping.page_classifier import classify_page, classify_page_bsoup, compare_classifiers
+from scraping.profile_source import is_archive, list_archive_pages, map_chunks_in_order, read_pages
 
 from config import VALIDATOR_PARAMS as PARAM
 
@@ -13,7 +17,177 @@ from config import VALIDATOR_PARAMS as PARAM
 # sys.path.append('..')
 
 
-def filter_faulty_profile_pages(from_prev_run=False):
+col_manifest_path = 'path'
+col_manifest_size = 'size'
+col_manifest_mtime = 'mtime_ns'
+col_manifest_digest = 'digest'
+col_manifest_cause = 'cause'
+col_manifest_classifier = 'classifier'
+
+
+def _inspect_pages(pages, classify):
+    """
+    Classifies a chunk of saved profile pages. Runs in a worker process when the validator runs with several jobs.
+    A page whose content hash equals the one recorded in the validation manifest keeps its recorded verdict.
+
+    Args:
+        pages (list[tuple(str, str, str, bytes)]): (path to the HTML file, recorded content hash, recorded cause,
+                                                   content of a page read from an archive or None) per page. The
+                                                   recorded values are None for pages not in the manifest.
+        classify (function): the page classifier, i.e. classify_page or classify_page_bsoup
+
+    Returns:
+        (list[tuple(str, bool, str, str)]): (path, whether the file exists, cause why the page is faulty or None,
+        content hash) per page
+    """
+    inspected = []
+    for page, known_digest, known_cause, content in pages:
+        if content is None:
+            if not os.path.isfile(page):
+                inspected.append((page, False, None, None))
+                continue
+            with open(page, 'rb') as file:
+                content = file.read()
+        digest = hashlib.sha1(content).hexdigest()
+        cause = known_cause if digest == known_digest else classify(content)
+        inspected.append((page, True, cause, digest))
+    return inspected
+
+
+def _inspect_pages_in_chunks(html_files, classify, jobs=1, chunk_size=500, archive=None):
+    """
+    Classifies saved profile pages chunk by chunk, in a pool of :jobs worker processes if :jobs > 1. Results are
+    yielded in the order of :html_files regardless of :jobs, or in the order the pages are stored in :archive, and a
+    progress line is logged after each chunk.
+
+    Args:
+        html_files (list[tuple(str, str, str)]): (path to the HTML file, recorded content hash, recorded cause)
+                                                 per page
+        classify (function): the page classifier, i.e. classify_page or classify_page_bsoup
+        jobs (int): number of worker processes
+        chunk_size (int): number of pages dispatched to a worker at once
+        archive (str): path to the archive the pages are streamed from, or None to read the HTML files in the workers.
+                       All :html_files must be stored in the archive
+
+    Yields:
+        (tuple(str, bool, str, str)): (path, whether the file exists, cause why the page is faulty or None,
+        content hash) per page
+    """
+    if not html_files:  # e.g. all verdicts are reused, so that an archive need not be read at all
+        return
+    if archive is None:
+        pages = ((page, known_digest, known_cause, None) for page, known_digest, known_cause in html_files)
+    else:
+        known = {page: (known_digest, known_cause) for page, known_digest, known_cause in html_files}
+        pages = ((page, *known[page], content)
+                 for page, content in read_pages(known, archive=archive, prefetch=PARAM.PREFETCH))
+
+    start, done = time.perf_counter(), 0
+    for inspected in map_chunks_in_order(partial(_inspect_pages, classify=classify), pages, jobs, chunk_size):
+        yield from inspected
+        done += len(inspected)
+        logging.info(f'PROGRESS: {done}/{len(html_files)} pages inspected '
+                     f'({done / max(time.perf_counter() - start, 1e-6):.0f} pages/s)')
+
+
+def _load_validation_manifest(classifier):
+    """
+    Loads the validation manifest :PARAM.MANIFEST_FILE, which records size, modification time, content hash, verdict
+    and classifier of every profile page inspected before. Verdicts of another classifier are dropped, as the
+    classifiers may disagree on a page.
+
+    Args:
+        classifier (str): name of the page classifier in use
+
+    Returns:
+        (dict[str -> tuple]): path of the HTML file -> (size, mtime_ns, digest, cause), cause being '' for fine pages
+    """
+    if not PARAM.USE_MANIFEST or not isfile(PARAM.MANIFEST_FILE):
+        return {}
+    df = pd.read_csv(PARAM.MANIFEST_FILE, delimiter=',', header=0, keep_default_na=False,
+                     dtype={col_manifest_size: 'int64', col_manifest_mtime: 'int64'})
+    is_stale = df[col_manifest_classifier] != classifier if col_manifest_classifier in df else pd.Series(True, df.index)
+    if is_stale.any():
+        logging.info(f'STALE: {is_stale.sum()} manifest entries were not classified by {classifier} and are dropped')
+        df = df[~is_stale]
+    return dict(zip(df[col_manifest_path], zip(df[col_manifest_size], df[col_manifest_mtime], df[col_manifest_digest],
+                                               df[col_manifest_cause])))
+
+
+def _save_validation_manifest(manifest, classifier):
+    """
+    Args:
+        manifest (dict[str -> tuple]): path of the HTML file -> (size, mtime_ns, digest, cause)
+        classifier (str): name of the page classifier that produced the verdicts
+    """
+    df = pd.DataFrame([(path, *record) for path, record in sorted(manifest.items())],
+                      columns=[col_manifest_path, col_manifest_size, col_manifest_mtime, col_manifest_digest,
+                               col_manifest_cause])
+    df[col_manifest_classifier] = classifier
+    df.to_csv(PARAM.MANIFEST_FILE, index=False)
+    logging.info(f'SAVED: Validation manifest of {len(df)} pages saved to {PARAM.MANIFEST_FILE}')
+
+
+def _validate_pages(html_files, classify, is_full_listing, archive_listing=None):
+    """
+    Classifies saved profile pages. If :PARAM.USE_MANIFEST is set, pages whose size and modification time are unchanged
+    since the last run of the same classifier keep their recorded verdict without being read, and the manifest is
+    updated afterwards.
+
+    Args:
+        html_files (list[str]): sorted paths to the HTML files
+        classify (function): the page classifier, i.e. classify_page or classify_page_bsoup
+        is_full_listing (bool): If True, :html_files are all pages of :PARAM.TARGET_DIR, so that pages that have been
+                                removed are dropped from the manifest
+        archive_listing (dict[str -> tuple(int, int)]): the pages stored in :PARAM.TARGET_DIR by list_archive_pages if
+                                                        it is an archive, or None if it is a folder
+
+    Yields:
+        (tuple(str, bool, str)): (path, whether the file exists, cause why the page is faulty or None) per page
+    """
+    manifest = _load_validation_manifest(classify.__name__)
+    new_manifest = {} if is_full_listing else dict(manifest)
+    stats, verdicts, to_inspect = {}, {}, []
+    for page in html_files:
+        known = manifest.get(page)
+        if archive_listing is not None:
+            if page not in archive_listing:
+                verdicts[page] = (False, None)
+                continue
+            stats[page] = archive_listing[page]
+        else:
+            try:
+                stat = os.stat(page)
+            except FileNotFoundError:
+                to_inspect.append((page, None, None))
+                continue
+            stats[page] = (stat.st_size, stat.st_mtime_ns)
+        if known and tuple(known[:2]) == stats[page]:
+            verdicts[page] = (True, known[3] or None)
+            new_manifest[page] = known
+        else:
+            to_inspect.append((page, known[2], known[3] or None) if known else (page, None, None))
+
+    if manifest:
+        logging.info(f'REUSED: {len(verdicts)} unchanged pages, {len(to_inspect)} new or modified pages to inspect')
+
+    archive = PARAM.TARGET_DIR if archive_listing is not None else None
+    for page, is_found, cause, digest in _inspect_pages_in_chunks(to_inspect, classify, jobs=PARAM.JOBS,
+                                                                  chunk_size=PARAM.CHUNK_SIZE, archive=archive):
+        verdicts[page] = (is_found, cause)
+        if is_found:
+            new_manifest[page] = (*stats[page], digest, cause or '')
+        else:
+            new_manifest.pop(page, None)
+
+    if PARAM.USE_MANIFEST:
+        _save_validation_manifest(new_manifest, classify.__name__)
+
+    for page in html_files:
+        yield (page, *verdicts[page])
+
+
+def filter_faulty_profile_pages(from_prev_run=False, archive_listing=None):
     """
     Extracts and stores the list of all public profile pages that are scraped without logging in L---e---, which may not
     contain full profile data as well as profiles pages that are not fully loaded due to network latency. These profiles will
@@ -22,13 +196,16 @@ def filter_faulty_profile_pages(from_prev_run=False):
         from_prev_run (bool): if True, the filter will only look for profiles filtered in the last run. This list of profiles
     is stored in the latest csv file in save_dir. If this list is empty, or no 'scrape_again*.csv' found, the filter
     will consider all profiles in profile_dir.
+        archive_listing (dict[str -> tuple(int, int)]): the pages stored in :PARAM.TARGET_DIR by list_archive_pages
+                                                        if it is an archive and has been listed already, or None
     """
 
     logging.info("RUNNING: Run the validator for filtering faulty profile pages")
-    if not isdir(PARAM.TARGET_DIR):
+    if not isdir(PARAM.TARGET_DIR) and not is_archive(PARAM.TARGET_DIR):
         logging.error('PROFILE DIR NOT FOUND')
 
     else:
+        archive_listing = archive_listing if archive_listing is not None else _list_target_archive()
         html_files = []
         if from_prev_run:
             scrape_again_files = glob.glob(join(PARAM.FAULTY_MISSING_DIR, f'{PARAM.TARGET_GROUP}*scrape_again*.csv'))
@@ -38,35 +215,25 @@ def filter_faulty_profile_pages(from_prev_run=False):
             scrape_again_file = scrape_again_files[-1]
             if scrape_again_file:
                 prev_filtered_urls = set(pd.read_csv(scrape_again_file)[col_URL])
-                html_files.extend(
-                    [join(PARAM.TARGET_DIR, f'{url.split("/in/")[1]}.html') for url in prev_filtered_urls])
+                # pages may be stored in a subfolder of an archive, so they are looked up by their profile names
+                archived_pages = {parse_filename(page): page for page in archive_listing or ()}
+                for url in prev_filtered_urls:
+                    profile_name = url.split("/in/")[1]
+                    html_files.append(archived_pages.get(profile_name, join(PARAM.TARGET_DIR, f'{profile_name}.html')))
 
-        if not html_files:
-            html_files = glob.glob(join(PARAM.TARGET_DIR, '*.html'))
+        is_full_listing = not html_files
+        if is_full_listing:
+            html_files = list(archive_listing) if archive_listing is not None else glob.glob(join(PARAM.TARGET_DIR,
+                                                                                                   '*.html'))
             logging.info(f'FOUND: {len(html_files)} html files')
 
+        classify = classify_page_bsoup if PARAM.PAGE_CLASSIFIER == 'bsoup' else classify_page
         faulty_pages = {}
-        for i, page in enumerate(html_files):
-            if not os.path.isfile(page):
+        for page, is_found, cause in _validate_pages(sorted(html_files), classify, is_full_listing, archive_listing):
+            if not is_found:
                 logging.warning(f'Profile {page}')
-                continue
-
-            with open(page, encoding='UTF-8') as file:
-                logging.info(f'{i}.INSPECT:{os.path.join(basename(dirname(page)), basename(page))}')
-                bsoup = BeautifulSoup(file.read(), "html.parser")
-                if not bsoup.find('main', {'class': 'core-rail'}):
-                    faulty_pages[f'https://www.l---e---.com/in/{parse_filename(page)}'] = 'page not loaded'
-                    continue
-
-                if bsoup.find('span', {'class': 'artdeco-loader__bars'}) or bsoup.find('span',
-                                                                                       {
-                                                                                           'class': 'artdeco-spinner--bars'}):
-                    faulty_pages[f'https://www.l---e---.com/in/{parse_filename(page)}'] = 'incomplete'
-                    continue
-
-                nav_header = bsoup.find('header', {'id': 'extended-nav'})
-                if not nav_header:
-                    faulty_pages[f'https://www.l---e---.com/in/{parse_filename(page)}'] = 'not logged in'
+            elif cause:
+                faulty_pages[f'https://www.l---e---.com/in/{parse_filename(page)}'] = cause
 
         if faulty_pages:
             make_dir(PARAM.FAULTY_MISSING_DIR)
@@ -79,26 +246,67 @@ def filter_faulty_profile_pages(from_prev_run=False):
             logging.info('No erroneous profile pages found')
 
 
-def verify_missing_profiles():
+def _list_target_archive():
+    """
+    Returns:
+        (dict[str -> tuple(int, int)]): the pages stored in :PARAM.TARGET_DIR by list_archive_pages if it is an archive,
+        or None if it is a folder
+    """
+    return list_archive_pages(PARAM.TARGET_DIR) if is_archive(PARAM.TARGET_DIR) else None
+
+
+def verify_page_classifier(sample_size, archive_listing=None):
+    """
+    Checks on a random sample of the profile pages in :PARAM.TARGET_DIR that the fast byte-level page classifier gives
+    the same verdicts as the BeautifulSoup-based one. Every disagreement is logged.
+
+    Args:
+        sample_size (int): number of profile pages to compare on
+        archive_listing (dict[str -> tuple(int, int)]): the pages stored in :PARAM.TARGET_DIR by list_archive_pages
+                                                        if it is an archive and has been listed already, or None
+
+    Returns:
+        (bool): True if both classifiers agree on all sampled pages
+    """
+    archive_listing = archive_listing if archive_listing is not None else _list_target_archive()
+    if archive_listing is not None:
+        archive, html_files = PARAM.TARGET_DIR, sorted(archive_listing)
+    else:
+        archive, html_files = None, sorted(glob.glob(join(PARAM.TARGET_DIR, '*.html')))
+    mismatches = compare_classifiers(html_files, sample_size=sample_size, archive=archive)
+    for page, (verdict, bsoup_verdict) in mismatches.items():
+        logging.warning(f'CLASSIFIER_MISMATCH: {page} regex={verdict}, bsoup={bsoup_verdict}')
+    logging.info(f'CLASSIFIER_VERIFIED: {min(sample_size, len(html_files)) - len(mismatches)} of '
+                 f'{min(sample_size, len(html_files))} sampled pages classified equally')
+    return not mismatches
+
+
+def verify_missing_profiles(archive_listing=None):
     """
     Checks the profiles scraped against the list of profile URLs to see which profiles have not been scraped.
     The list of missing profiles if any will be stored as csv file after the verification.
+
+    Args:
+        archive_listing (dict[str -> tuple(int, int)]): the pages stored in :PARAM.TARGET_DIR by list_archive_pages
+                                                        if it is an archive and has been listed already, or None
     """
 
     logging.info("RUNNING: Run the validator for verifying missing profile pages")
-    missing_profiles = set()
-    all_urls = get_URL_AID_mappings(PARAM.URLS_DIR).keys()
-    for i, url in enumerate(all_urls):
-        if (i > 0 and i % 500 == 0) or i == len(all_urls) - 1:
-            print(f'VERIFYING_MISSING_PROFILES: Done verifying {i} profiles')
-        if '/in/' in url:
-            profile_name = url.partition('/in/')[2]
-            profile_path = join(PARAM.TARGET_DIR, f'{profile_name}.html')
-            if not os.path.isfile(profile_path):
-                missing_profiles.add(url)
-
-            if len(profile_name) == 2:
-                logging.debug(f'Possibly invalid profile: {profile_name}')
+    all_urls = pd.Series(sorted(get_profile_urls(PARAM.URLS_DIR)), dtype=object)
+    all_urls = all_urls[all_urls.str.contains('/in/', regex=False)]
+    profile_names = all_urls.str.partition('/in/')[2]
+    for profile_name in profile_names[profile_names.str.len() == 2]:
+        logging.debug(f'Possibly invalid profile: {profile_name}')
+
+    archive_listing = archive_listing if archive_listing is not None else _list_target_archive()
+    if archive_listing is not None:
+        scraped_profiles = {parse_filename(page) for page in archive_listing}
+    else:
+        with os.scandir(PARAM.TARGET_DIR) as entries:
+            scraped_profiles = {entry.name[:-len('.html')] for entry in entries if entry.name.endswith('.html')}
+    logging.info(f'VERIFYING_MISSING_PROFILES: {len(all_urls)} profile URLs against {len(scraped_profiles)} profiles')
+
+    missing_profiles = set(all_urls[~profile_names.isin(scraped_profiles)])
 
     unavailable_profiles = set()
     if isfile(PARAM.UNAVAILABLE_PROFILES_FILE):
@@ -108,7 +316,7 @@ def verify_missing_profiles():
     logging.info(f'COUNT:{len(missing_profiles)} missing profiles found!')
     if missing_profiles:
         make_dir(PARAM.FAULTY_MISSING_DIR)
-        df = pd.DataFrame([{col_URL: url} for url in missing_profiles], columns=[col_URL])
+        df = pd.DataFrame({col_URL: sorted(missing_profiles)}, columns=[col_URL])
         df.to_csv(join(PARAM.FAULTY_MISSING_DIR, f'{basename(PARAM.TARGET_DIR)}__missing_profiles__{get_now()}.csv'),
                   index=False)
         for url in missing_profiles:
@@ -127,8 +335,12 @@ def run():
 
     logging.basicConfig(level=logging.INFO)
 
-    filter_faulty_profile_pages(from_prev_run=False)
-    verify_missing_profiles()
+    # an archive is listed once for all steps, since listing it means decompressing it
+    archive_listing = _list_target_archive()
+    if PARAM.VERIFY_CLASSIFIER_SAMPLE_SIZE > 0:
+        verify_page_classifier(PARAM.VERIFY_CLASSIFIER_SAMPLE_SIZE, archive_listing)
+    filter_faulty_profile_pages(from_prev_run=False, archive_listing=archive_listing)
+    verify_missing_profiles(archive_listing)
 
 
 if __name__ == '__main__':